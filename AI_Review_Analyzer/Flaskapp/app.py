@@ -1,12 +1,33 @@
-from flask import Flask, render_template, request, redirect, url_for
+from flask import (
+    Flask, render_template, request, redirect, url_for, jsonify, make_response,
+    abort, send_file,
+)
 from pathlib import Path
 import joblib
 import logging
-import numpy as np   
 import csv
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from collections import Counter
+import hashlib
 import re
+import sys
+import threading
+from collections import OrderedDict
+
+try:
+    from .near_duplicates import NearDuplicateIndex
+    from .search_index import SearchIndex
+    from .rollups import Rollups, HIST_LOW, HIST_STEP, HIST_BINS
+    from . import history_archive, history_export, history_store
+    from .explain import LinearExplainer, ForestExplainer
+except ImportError:  # running as `python app.py` from inside Flaskapp/
+    from near_duplicates import NearDuplicateIndex
+    from search_index import SearchIndex
+    from rollups import Rollups, HIST_LOW, HIST_STEP, HIST_BINS
+    import history_archive
+    import history_export
+    import history_store
+    from explain import LinearExplainer, ForestExplainer
 
 
 
@@ -23,7 +44,17 @@ log = logging.getLogger(__name__)
 APP_DIR = Path(__file__).resolve().parent              
 BASE_DIR = APP_DIR.parent                              
 MODELS_DIR = BASE_DIR / "models"                       
+TEMPLATES_DIR = APP_DIR / "templates"
 HISTORY_FILE = APP_DIR / "data" / "review_history.csv" 
+SEARCH_INDEX_FILE = APP_DIR / "data" / "search_index.pkl"
+DUP_INDEX_FILE = APP_DIR / "data" / "near_duplicates.pkl"
+ROLLUP_FILE = APP_DIR / "data" / "rollups.json"
+ARCHIVE_DIR = APP_DIR / "data" / "history_archive"
+EXPORT_DIR = APP_DIR / "data" / "exports"
+
+# Rotate the active CSV into a Parquet archive past either threshold
+ROTATE_MAX_BYTES = 50 * 1024 * 1024
+ROTATE_MAX_AGE = timedelta(days=30)
 
 
 def load_or_die(path: Path, name: str):
@@ -53,49 +84,227 @@ except Exception as e:
     # Stop the app if models are missing
     raise
 
-def predict_sentiment(review_text: str):
-    vec = SENTIMENT_VECT.transform([review_text])
-    probs = SENTIMENT_MODEL.predict_proba(vec)[0]
-    pred_idx = np.argmax(probs)
-    label = SENTIMENT_MODEL.classes_[pred_idx]
-    sentiment = "Positive" if label == "positive" else "Negative"
-    return sentiment, float(probs[pred_idx] * 100)
+# Per-term explanations; the forest path contributions are precomputed here
+SENTIMENT_EXPLAINER = LinearExplainer(SENTIMENT_MODEL, SENTIMENT_VECT)
+FAKE_EXPLAINER = ForestExplainer(FAKE_MODEL, FAKE_VECT)
+
+
+def score_reviews(texts, explain: bool = False, top_k: int = 5):
+    """
+    Sentiment and authenticity for a batch of texts: one transform and one
+    predict_proba per model for all of them. This is the only place the
+    model classes are mapped to display labels. With explain=True each
+    result also gets the top contributing n-grams for both predictions.
+    """
+    s_vec = SENTIMENT_VECT.transform(texts)
+    s_probs = SENTIMENT_MODEL.predict_proba(s_vec)
+    s_idx = s_probs.argmax(axis=1)
+
+    f_vec = FAKE_VECT.transform(texts)
+    f_probs = FAKE_MODEL.predict_proba(f_vec)
+    f_idx = f_probs.argmax(axis=1)
+
+    results = []
+    for i, text in enumerate(texts):
+        s_label = SENTIMENT_MODEL.classes_[s_idx[i]]
+        f_label = FAKE_MODEL.classes_[f_idx[i]]
+        results.append({
+            "review": text,
+            "sentiment": "Positive" if s_label == "positive" else "Negative",
+            "sentiment_prob": float(s_probs[i, s_idx[i]] * 100),
+            "authenticity": "Genuine" if f_label == "genuine" else "Fake",
+            "authenticity_prob": float(f_probs[i, f_idx[i]] * 100),
+        })
+
+    if explain:
+        s_terms = SENTIMENT_EXPLAINER.explain(s_vec, s_idx, top_k)
+        f_terms = FAKE_EXPLAINER.explain(f_vec, f_idx, top_k)
+        for result, s_t, f_t in zip(results, s_terms, f_terms):
+            result["sentiment_terms"] = s_t
+            result["authenticity_terms"] = f_t
+    return results
+
+def iter_history(columns=None, since=None):
+    """
+    Yield logged reviews one row at a time (oldest first): archived rows,
+    then the active CSV. `columns` and `since` are pushed down to the
+    Parquet archives. Shares the export reader, so a rotation mid-read
+    neither drops nor repeats rows.
+    """
+    for chunk in history_export.iter_chunks(HISTORY_FILE, ARCHIVE_DIR,
+                                            since=since, columns=columns):
+        yield from chunk
+
+
+# Near-duplicate clusters over the logged reviews; reviews that land in a big
+# cluster are likely copies of a spam template. Persisted like the search
+# index, so startup only hashes rows logged since the last save.
+DUP_INDEX = NearDuplicateIndex(HISTORY_FILE, DUP_INDEX_FILE, ARCHIVE_DIR)
+DUP_INDEX.load()
+log.info("Near-duplicate index: %d clusters", len(DUP_INDEX))
+
+
+# -------------------------------------------------
+# HTTP caching for pages built from history / static templates
+# -------------------------------------------------
+# Rendered pages keyed by name -> (version, html). Cleared by log_review, and
+# each entry also carries the history version it was built from, so a write
+# made by another worker process is still noticed. Keys are built from parsed
+# arguments only (not the raw URL), and the cache is capped by memory: pages
+# over RENDER_CACHE_MAX_PAGE are never kept, the oldest entries go first.
+RENDER_CACHE = OrderedDict()
+RENDER_CACHE_MAX_BYTES = 32 * 1024 * 1024
+RENDER_CACHE_MAX_PAGE = 4 * 1024 * 1024
+RENDER_CACHE_LOCK = threading.Lock()
+
+
+def history_version():
+    """
+    (version string, None) for the history file; changes on every write.
+    No mtime: Last-Modified only has whole seconds, so a write in the same
+    second as a view would get a stale 304. These pages rely on the ETag.
+    """
+    try:
+        st = HISTORY_FILE.stat()
+    except FileNotFoundError:
+        return "empty", None
+    return f"{st.st_size}-{st.st_mtime_ns}", None
+
 
+def template_version(name: str):
+    """(version string, mtime) of a template together with base.html."""
+    mtimes = [(TEMPLATES_DIR / n).stat().st_mtime_ns for n in ("base.html", name)]
+    return "-".join(map(str, mtimes)), max(mtimes) / 1e9
+
+
+def cached_page(key: str, versions, render):
+    """
+    Serve a page with an ETag, plus Last-Modified when every version has an
+    mtime. Answers 304 without rendering when the client copy is current,
+    and reuses the last rendered HTML while the versions are unchanged.
+    """
+    version = "|".join(v for v, _ in versions)
+    mtimes = [m for _, m in versions]
+    etag = hashlib.md5(f"{key}|{version}".encode("utf-8")).hexdigest()
+    last_modified = None
+    if None not in mtimes:
+        last_modified = datetime.fromtimestamp(int(max(mtimes)), tz=timezone.utc)
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        fresh = (last_modified is not None and since is not None
+                 and last_modified <= since)
+
+    if fresh:
+        resp = make_response("", 304)
+    else:
+        with RENDER_CACHE_LOCK:
+            hit = RENDER_CACHE.get(key)
+        if hit and hit[0] == version:
+            html = hit[1]
+        else:
+            html = render()
+            cache_html(key, version, html)
+        resp = make_response(html)
+
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    resp.cache_control.no_cache = True   # always revalidate, usually a 304
+    return resp
+
+
+def cache_html(key: str, version: str, html: str) -> None:
+    """Keep a rendered page, evicting the oldest ones past the byte budget."""
+    size = sys.getsizeof(html)
+    with RENDER_CACHE_LOCK:
+        RENDER_CACHE.pop(key, None)
+        if size > RENDER_CACHE_MAX_PAGE:
+            return
+        RENDER_CACHE[key] = (version, html)
+        total = sum(sys.getsizeof(h) for _, h in RENDER_CACHE.values())
+        while total > RENDER_CACHE_MAX_BYTES:
+            _, (_, old) = RENDER_CACHE.popitem(last=False)
+            total -= sys.getsizeof(old)
+
+
+# Serializes appends to the active CSV with its rotation: HISTORY_LOCK between
+# threads, history_store.locked() between processes (other gunicorn workers,
+# `python history_archive.py`)
+HISTORY_LOCK = threading.Lock()
 
-def predict_authenticity(review_text: str):
-    vec = FAKE_VECT.transform([review_text])
-    probs = FAKE_MODEL.predict_proba(vec)[0]
-    pred_idx = np.argmax(probs)
-    label = FAKE_MODEL.classes_[pred_idx]
-    authenticity = "Genuine" if label == "genuine" else "Fake"
-    return authenticity, float(probs[pred_idx] * 100)
 
 def log_review(result: dict) -> None:
     """Append one analyzed review to data/review_history.csv."""
-    first_time = not HISTORY_FILE.exists()
-
-    with HISTORY_FILE.open("a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
+    with HISTORY_LOCK, history_store.locked(HISTORY_FILE):
+        first_time = not HISTORY_FILE.exists()
+
+        with HISTORY_FILE.open("a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+
+            # Write header first time
+            if first_time:
+                writer.writerow([
+                    "timestamp",
+                    "review",
+                    "sentiment",
+                    "sentiment_prob",
+                    "authenticity",
+                    "authenticity_prob",
+                ])
 
-        # Write header first time
-        if first_time:
             writer.writerow([
-                "timestamp",
-                "review",
-                "sentiment",
-                "sentiment_prob",
-                "authenticity",
-                "authenticity_prob",
+                datetime.now().strftime("%Y-%m-%d %H:%M"),
+                result["review"],
+                result["sentiment"],
+                f"{result['sentiment_prob']:.1f}",
+                result["authenticity"],
+                f"{result['authenticity_prob']:.1f}",
             ])
 
-        writer.writerow([
-            datetime.now().strftime("%Y-%m-%d %H:%M"),
-            result["review"],
-            result["sentiment"],
-            f"{result['sentiment_prob']:.1f}",
-            result["authenticity"],
-            f"{result['authenticity_prob']:.1f}",
-        ])
+        # pick up the new row in the search index, rollups and dup clusters
+        SEARCH_INDEX.catch_up()
+        ROLLUPS.catch_up()
+        DUP_INDEX.catch_up()
+
+        rotated = False
+        if history_archive.should_rotate(
+            HISTORY_FILE, ROTATE_MAX_BYTES, ROTATE_MAX_AGE
+        ):
+            rotated = rotate_history()
+
+    if rotated:
+        start_compaction()
+
+    # history-derived pages must be rebuilt on the next view
+    with RENDER_CACHE_LOCK:
+        RENDER_CACHE.clear()
+
+
+def rotate_history() -> bool:
+    """
+    Move the active CSV aside into the archive directory (locks held).
+    Only two renames; the derived stores and readers treat the moved CSV as
+    an archive until start_compaction() has turned it into Parquet.
+    A failed rotation (e.g. on Windows, where a reader holding the CSV open
+    blocks the rename) is logged and retried on the next write; the row is
+    already saved, so the request still succeeds.
+    """
+    try:
+        return history_archive.rotate(HISTORY_FILE, ARCHIVE_DIR) is not None
+    except OSError as e:
+        log.warning("History rotation failed, will retry: %s", e)
+        return False
+
+
+def start_compaction() -> None:
+    """Compact rotated CSVs into Parquet without holding any lock."""
+    threading.Thread(
+        target=history_archive.compact_pending, args=(ARCHIVE_DIR,),
+        daemon=True,
+    ).start()
 
 STOPWORDS = {
     "the","a","an","is","am","are","was","were","and","or","of","to","in",
@@ -109,6 +318,22 @@ def tokenize(text: str):
     tokens = re.findall(r"[a-zA-Z']+", text.lower())
     return [t for t in tokens if t not in STOPWORDS and len(t) > 2]
 
+
+# Full-text index for /search; persisted so startup only indexes new rows
+SEARCH_INDEX = SearchIndex(HISTORY_FILE, SEARCH_INDEX_FILE, ARCHIVE_DIR, tokenize)
+SEARCH_INDEX.load()
+log.info("Search index: %d rows", len(SEARCH_INDEX))
+
+# Hour/day counters for /stats (build from scratch: python rollups.py --backfill)
+ROLLUPS = Rollups(HISTORY_FILE, ROLLUP_FILE, ARCHIVE_DIR)
+ROLLUPS.load()
+
+# finish compactions interrupted by a restart
+start_compaction()
+
+# Exports run in background threads so no request waits on a full history scan
+EXPORT_JOBS = history_export.ExportJobs(HISTORY_FILE, ARCHIVE_DIR, EXPORT_DIR)
+
 @app.route("/", methods=["GET"])
 def home():
     """Main page with big textarea + Analyze button."""
@@ -135,20 +360,18 @@ def analyze():
     
 
 
-    sentiment, sentiment_prob = predict_sentiment(review)
-    authenticity, authenticity_prob = predict_authenticity(review)
+    # "Show why" checkbox on the home page
+    explain = request.form.get("explain") == "on"
 
-    result = {
-    "review": review,
-    "sentiment": sentiment,
-    "sentiment_prob": sentiment_prob,
-    "authenticity": authenticity,
-    "authenticity_prob": authenticity_prob,
-    }
+    result = score_reviews([review], explain=explain)[0]
 
-    # save to history log
+    # save to history log (this also adds it to the near-duplicate index)
     log_review(result)
 
+    dup = DUP_INDEX.query(review)
+    result["dup_cluster_id"] = dup["cluster_id"]
+    result["dup_cluster_size"] = dup["cluster_size"]
+
     return render_template("ana.html", result=result)
 
     # ana.html is the result page
@@ -158,28 +381,127 @@ def analyze():
 @app.route("/about", methods=["GET"])
 def about():
     """About / project description page."""
-    return render_template("about.html")
+    return cached_page(
+        "about", [template_version("about.html")],
+        lambda: render_template("about.html"),
+    )
 
 
 @app.route("/how_it_works", methods=["GET"])
 def how_it_works():
     """Explain pipeline: Input -> NLP/ML -> Output."""
-    return render_template("how_it_works.html")
+    return cached_page(
+        "how_it_works", [template_version("how_it_works.html")],
+        lambda: render_template("how_it_works.html"),
+    )
 
 
 @app.route("/history", methods=["GET"])
 def history():
-    rows = []
-    if HISTORY_FILE.exists():
-        with HISTORY_FILE.open(encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-            rows.reverse()   # show latest first
+    """
+    All analyzed reviews, latest first.
+    ?since=YYYY-MM-DD limits it to recent rows (pushed down to the archives).
+    """
+    since = request.args.get("since", "")
+    try:
+        since_dt = datetime.strptime(since, "%Y-%m-%d") if since else None
+    except ValueError:
+        since_dt = None
+    return cached_page(
+        f"history|{since_dt:%Y-%m-%d}" if since_dt else "history",
+        [history_version(), template_version("history.html")],
+        lambda: render_history(since_dt),
+    )
+
+
+def render_history(since=None):
+    rows = list(iter_history(since=since))
+    rows.reverse()   # show latest first
 
     return render_template("history.html", rows=rows)
 
+@app.route("/search", methods=["GET"])
+def search():
+    """Search past reviews by words, optionally filtered by labels."""
+    q = request.args.get("q", "").strip()
+    sentiment = request.args.get("sentiment", "")
+    authenticity = request.args.get("authenticity", "")
+    page = request.args.get("page", 1, type=int)
+
+    rows, has_next = SEARCH_INDEX.search(
+        q, sentiment=sentiment, authenticity=authenticity, page=page
+    )
+    searched = bool(q or sentiment or authenticity)
+
+    return render_template(
+        "search.html",
+        rows=rows,
+        q=q,
+        sentiment=sentiment,
+        authenticity=authenticity,
+        page=max(page, 1),
+        has_next=has_next,
+        searched=searched,
+    )
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    """
+    Dashboard trends per hour or day, read only from the rollups.
+    ?format=json returns the same data for other clients.
+    """
+    granularity = request.args.get("granularity", "day")
+    if granularity not in ("hour", "day"):
+        granularity = "day"
+    limit = min(max(request.args.get("limit", 30, type=int), 1), 500)
+
+    # pick up rows logged (or rotated) by other worker processes
+    ROLLUPS.refresh()
+    DUP_INDEX.refresh()
+
+    if request.args.get("format") == "json":
+        return jsonify(
+            granularity=granularity,
+            series=ROLLUPS.series(granularity, limit),
+            histograms=ROLLUPS.histograms(granularity, limit),
+            duplicates=DUP_INDEX.top_clusters(),
+        )
+
+    return cached_page(
+        f"stats|{granularity}|{limit}",
+        [history_version(), template_version("stats.html")],
+        lambda: render_stats(granularity, limit),
+    )
+
+
+def render_stats(granularity: str, limit: int):
+    series = ROLLUPS.series(granularity, limit)
+    histograms = ROLLUPS.histograms(granularity, limit)
+    bins = [
+        f"{HIST_LOW + i * HIST_STEP:.0f}-{HIST_LOW + (i + 1) * HIST_STEP:.0f}%"
+        for i in range(HIST_BINS)
+    ]
+    max_total = max((p["total"] for p in series), default=0)
+    return render_template(
+        "stats.html",
+        granularity=granularity,
+        series=series,
+        histograms=histograms,
+        bins=bins,
+        max_total=max_total,
+        duplicates=DUP_INDEX.top_clusters(),
+    )
+
 @app.route("/word_cloud", methods=["GET"])
 def word_cloud():
+    return cached_page(
+        "word_cloud",
+        [history_version(), template_version("word_cloud.html")],
+        render_word_cloud,
+    )
+
+
+def render_word_cloud():
     """
     Build simple 'word cloud' style insights from the history:
     - words that appear often in Positive vs Negative reviews
@@ -190,27 +512,24 @@ def word_cloud():
     gen_counter = Counter()
     fake_counter = Counter()
 
-    if HISTORY_FILE.exists():
-        with HISTORY_FILE.open(encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                review_text = row.get("review", "")
-                sentiment = row.get("sentiment", "")
-                authenticity = row.get("authenticity", "")
+    for row in iter_history(columns=["review", "sentiment", "authenticity"]):
+        review_text = row.get("review", "")
+        sentiment = row.get("sentiment", "")
+        authenticity = row.get("authenticity", "")
 
-                words = tokenize(review_text)
+        words = tokenize(review_text)
 
-                # sentiment words
-                if sentiment == "Positive":
-                    pos_counter.update(words)
-                elif sentiment == "Negative":
-                    neg_counter.update(words)
+        # sentiment words
+        if sentiment == "Positive":
+            pos_counter.update(words)
+        elif sentiment == "Negative":
+            neg_counter.update(words)
 
-                # authenticity words
-                if authenticity == "Genuine":
-                    gen_counter.update(words)
-                elif authenticity == "Fake":
-                    fake_counter.update(words)
+        # authenticity words
+        if authenticity == "Genuine":
+            gen_counter.update(words)
+        elif authenticity == "Fake":
+            fake_counter.update(words)
 
     def make_cloud(counter: Counter, max_words: int = 30):
         items = counter.most_common(max_words)
@@ -243,6 +562,64 @@ def word_cloud():
     )
 
 
+@app.route("/export", methods=["GET", "POST"])
+def export():
+    """
+    GET  -> export form
+    POST -> start a background export job and go to its status page
+            (the request itself never reads the history)
+    """
+    if request.method == "GET":
+        return render_template("export.html", formats=history_export.FORMATS)
+
+    fmt = request.form.get("format", "csv")
+    if fmt not in history_export.FORMATS:
+        fmt = "csv"
+    try:
+        filters = history_export.parse_filters(
+            request.form.get("since", ""),
+            request.form.get("until", ""),
+            request.form.get("sentiment", ""),
+            request.form.get("authenticity", ""),
+        )
+    except ValueError:
+        return render_template(
+            "export.html",
+            formats=history_export.FORMATS,
+            error="Dates must look like YYYY-MM-DD.",
+        )
+
+    job_id = EXPORT_JOBS.start(fmt, filters)
+    return redirect(url_for("export_job", job_id=job_id))
+
+
+@app.route("/export/jobs/<job_id>", methods=["GET"])
+def export_job(job_id):
+    """Progress of a background export (?format=json for polling clients)."""
+    job = EXPORT_JOBS.get(job_id)
+    if job is None:
+        abort(404)
+    if request.args.get("format") == "json":
+        job = {k: v for k, v in job.items() if k != "path"}
+        if job["state"] == "done":
+            job["download_url"] = url_for("export_download", job_id=job_id)
+        return jsonify(job)
+    return render_template("export.html", formats=history_export.FORMATS, job=job)
+
+
+@app.route("/export/jobs/<job_id>/download", methods=["GET"])
+def export_download(job_id):
+    job = EXPORT_JOBS.get(job_id)
+    if job is None or job["state"] != "done":
+        abort(404)
+    return send_file(
+        job["path"],
+        mimetype=history_export.FORMATS[job["format"]][0],
+        as_attachment=True,
+        download_name=f"review_history{history_export.FORMATS[job['format']][1]}",
+    )
+
+
 @app.route("/bulk", methods=["GET"])
 def bulk():
     """(Optional) Bulk upload / history page."""
@@ -0,0 +1,163 @@
+"""
+Per-term explanations for the two models ("why Fake?", "why Negative?").
+
+Both explainers work on the TF-IDF rows the app already computed and add
+well under a millisecond per review, so they can run on every request and on
+whole batches. Nothing is re-scored (no LIME / kernel SHAP sampling).
+
+- LinearExplainer (sentiment LogisticRegression): the contribution of an
+  n-gram is its TF-IDF weight times its coefficient.
+- ForestExplainer (authenticity RandomForest): path contributions. Every
+  split moves the class probability from the parent node to the child; that
+  change is credited to the split's feature. The per-leaf totals are
+  precomputed once, so explaining a review is just finding its leaf in each
+  tree (all trees walked together with numpy) and summing those leaf rows.
+"""
+
+import numpy as np
+from scipy import sparse
+
+BATCH_ROWS = 256
+
+
+def _top_terms(indices, weights, names, top_k: int, present=None):
+    """
+    [{"term", "weight", "present"}] for the largest |weight|, biggest first.
+    `present` is False for n-grams that count because they are *missing*
+    from the review (trees split on those too).
+    """
+    if len(weights) == 0:
+        return []
+    k = min(top_k, len(weights))
+    order = np.argpartition(-np.abs(weights), k - 1)[:k]
+    order = order[np.argsort(-np.abs(weights[order]))]
+    return [
+        {
+            "term": str(names[indices[i]]),
+            "weight": float(weights[i]),
+            "present": present is None or int(indices[i]) in present,
+        }
+        for i in order
+        if weights[i] != 0
+    ]
+
+
+class LinearExplainer:
+    """Top n-grams for a linear model: tf-idf value x coefficient."""
+
+    def __init__(self, model, vectorizer):
+        self.names = vectorizer.get_feature_names_out()
+        coef = np.asarray(model.coef_, dtype=np.float64)
+        if coef.shape[0] == 1:
+            # binary: coef_ pushes towards classes_[1]
+            coef = np.vstack([-coef[0], coef[0]])
+        self.coef = coef
+
+    def explain(self, X, pred_idx, top_k: int = 5):
+        """
+        One list per row of X. A positive weight pushes towards the predicted
+        class, a negative one pulls away from it.
+        """
+        X = sparse.csr_matrix(X)
+        out = []
+        for i, c in enumerate(pred_idx):
+            start, end = X.indptr[i], X.indptr[i + 1]
+            idx = X.indices[start:end]
+            weights = X.data[start:end] * self.coef[c, idx]
+            out.append(_top_terms(idx, weights, self.names, top_k))
+        return out
+
+
+class ForestExplainer:
+    """Top n-grams for a tree ensemble from precomputed path contributions."""
+
+    def __init__(self, model, vectorizer):
+        self.names = vectorizer.get_feature_names_out()
+        trees = [est.tree_ for est in model.estimators_]
+        self.n_trees = len(trees)
+        n_features = len(self.names)
+        n_classes = len(model.classes_)
+
+        sizes = [t.node_count for t in trees]
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+        self._roots = offsets[:-1]
+
+        # all trees flattened into one node table
+        left, right, feature, threshold, prob = [], [], [], [], []
+        for t, off in zip(trees, offsets):
+            internal = t.children_left != -1
+            left.append(np.where(internal, t.children_left + off, -1))
+            right.append(np.where(internal, t.children_right + off, -1))
+            feature.append(np.where(internal, t.feature, 0))
+            threshold.append(t.threshold)
+            v = t.value[:, 0, :]
+            prob.append(v / v.sum(axis=1, keepdims=True))
+        self._left = np.concatenate(left)
+        self._right = np.concatenate(right)
+        self._feature = np.concatenate(feature)
+        self._threshold = np.concatenate(threshold)
+        prob = np.concatenate(prob)
+
+        # leaf -> summed (feature, delta probability) along its root path
+        parent = np.full(len(self._left), -1)
+        internal = np.flatnonzero(self._left != -1)
+        parent[self._left[internal]] = internal
+        parent[self._right[internal]] = internal
+
+        rows, cols, vals = [], [], []
+        for leaf in np.flatnonzero(self._left == -1):
+            node = leaf
+            while parent[node] != -1:
+                up = parent[node]
+                rows.append(leaf)
+                cols.append(self._feature[up])
+                vals.append(prob[node] - prob[up])
+                node = up
+        vals = np.asarray(vals).reshape(-1, n_classes)
+        shape = (len(self._left), n_features)
+        # one (nodes x features) matrix per class; duplicates get summed
+        self._leaf_contrib = [
+            sparse.csr_matrix((vals[:, c], (rows, cols)), shape=shape)
+            for c in range(n_classes)
+        ]
+
+    def leaves(self, dense: np.ndarray) -> np.ndarray:
+        """Leaf node ids, shape (n_samples, n_trees), for a dense batch."""
+        m = dense.shape[0]
+        node = np.tile(self._roots, (m, 1))
+        rows = np.arange(m)[:, None]
+        while True:
+            nxt_left = self._left[node]
+            internal = nxt_left != -1
+            if not internal.any():
+                return node
+            x = dense[rows, self._feature[node]]
+            go_left = x <= self._threshold[node]
+            nxt = np.where(go_left, nxt_left, self._right[node])
+            node = np.where(internal, nxt, node)
+
+    def explain(self, X, pred_idx, top_k: int = 5):
+        """
+        One list per row of X. Weights are averaged over the trees and are in
+        probability units towards the predicted class.
+        """
+        X = sparse.csr_matrix(X, dtype=np.float32)
+        pred_idx = np.asarray(pred_idx)
+        n_nodes = len(self._left)
+        out = []
+        for start in range(0, X.shape[0], BATCH_ROWS):
+            chunk = X[start:start + BATCH_ROWS]
+            leaves = self.leaves(chunk.toarray())
+            m = leaves.shape[0]
+            hits = sparse.csr_matrix(
+                (np.ones(leaves.size), leaves.ravel(),
+                 np.arange(0, leaves.size + 1, self.n_trees)),
+                shape=(m, n_nodes),
+            )
+            per_class = [hits @ mat for mat in self._leaf_contrib]
+            for i in range(m):
+                row = per_class[pred_idx[start + i]].getrow(i)
+                present = set(chunk.indices[chunk.indptr[i]:chunk.indptr[i + 1]])
+                out.append(_top_terms(row.indices, row.data / self.n_trees,
+                                      self.names, top_k, present))
+        return out
@@ -0,0 +1,362 @@
+"""
+Columnar archive for old review history.
+
+review_history.csv is only the *active* log. Once it gets too big or its
+oldest row too old, rotate() moves it aside to
+data/history_archive/history-<timestamp>.csv and starts a fresh CSV with just
+the header. That is only a rename, so it is done under the history lock;
+compact() then rewrites the moved CSV as history-<timestamp>.parquet (labels
+dictionary-encoded, confidences as float32, timestamps as real timestamps)
+in the background and deletes it. Until then the pending CSV is read like
+any other archive.
+
+Readers go through iter_rows()/iter_batches(), which only load the requested
+columns and push timestamp filters down to the Parquet row groups. Rows come
+back in the same shape as csv.DictReader rows so callers don't care whether
+a row is archived or still in the CSV.
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+try:
+    from . import history_store
+except ImportError:
+    import history_store
+
+log = logging.getLogger(__name__)
+
+TS_FORMAT = "%Y-%m-%d %H:%M"
+ROW_GROUP_ROWS = 64_000
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("s")),
+    ("review", pa.string()),
+    ("sentiment", pa.dictionary(pa.int8(), pa.string())),
+    ("sentiment_prob", pa.float32()),
+    ("authenticity", pa.dictionary(pa.int8(), pa.string())),
+    ("authenticity_prob", pa.float32()),
+])
+COLUMNS = ARCHIVE_SCHEMA.names
+
+
+def archive_files(archive_dir: Path):
+    """
+    Archive files, oldest first: Parquet archives and rotated CSVs still
+    waiting for compaction. While an archive briefly has both, Parquet wins.
+    """
+    archive_dir = Path(archive_dir)
+    if not archive_dir.exists():
+        return []
+    by_stem = {p.stem: p for p in archive_dir.glob("history-*.csv")}
+    by_stem.update((p.stem, p) for p in archive_dir.glob("history-*.parquet"))
+    return [by_stem[stem] for stem in sorted(by_stem)]
+
+
+def parse_ts(value: str):
+    try:
+        return datetime.strptime(value, TS_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# -------------------------------------------------
+# Rotation
+# -------------------------------------------------
+def should_rotate(history_file: Path, max_bytes: int, max_age: timedelta,
+                  now: datetime = None) -> bool:
+    """True once the active log passes the size or age threshold."""
+    history_file = Path(history_file)
+    if not history_file.exists():
+        return False
+    if history_file.stat().st_size >= max_bytes:
+        return True
+    for _, _, row in history_store.scan(history_file):
+        oldest = parse_ts(row.get("timestamp"))
+        return oldest is not None and (now or datetime.now()) - oldest >= max_age
+    return False
+
+
+def rows_to_batch(rows) -> pa.RecordBatch:
+    """Archive-schema record batch from CSV-style row dicts."""
+    return pa.RecordBatch.from_arrays([
+        pa.array([parse_ts(r.get("timestamp")) for r in rows],
+                 type=ARCHIVE_SCHEMA.field("timestamp").type),
+        pa.array([r.get("review", "") for r in rows], type=pa.string()),
+        pa.array([r.get("sentiment", "") for r in rows],
+                 type=ARCHIVE_SCHEMA.field("sentiment").type),
+        pa.array([_to_float(r.get("sentiment_prob")) for r in rows],
+                 type=pa.float32()),
+        pa.array([r.get("authenticity", "") for r in rows],
+                 type=ARCHIVE_SCHEMA.field("authenticity").type),
+        pa.array([_to_float(r.get("authenticity_prob")) for r in rows],
+                 type=pa.float32()),
+    ], schema=ARCHIVE_SCHEMA)
+
+
+def rotate(history_file: Path, archive_dir: Path):
+    """
+    Move the active CSV aside as a pending archive and reset it to its
+    header. Returns the pending path, or None if there were no rows.
+    The caller must hold history_store.locked() so nothing is appended
+    meanwhile; compact() the returned file afterwards, outside the lock.
+    """
+    history_file = Path(history_file)
+    archive_dir = Path(archive_dir)
+    if next(history_store.scan(history_file), None) is None:
+        return None
+    archive_dir.mkdir(parents=True, exist_ok=True)
+
+    pending = archive_dir / f"history-{datetime.now():%Y%m%d%H%M%S%f}.csv"
+    header = history_store.read_header(history_file)
+    fresh = history_file.with_suffix(".rotating")
+    with fresh.open("w", newline="", encoding="utf-8") as f:
+        f.write(",".join(header) + "\r\n")
+    try:
+        os.replace(history_file, pending)
+    except OSError:
+        fresh.unlink(missing_ok=True)
+        raise
+    os.replace(fresh, history_file)
+
+    log.info("Rotated history into %s", pending.name)
+    return pending
+
+
+def compact(pending: Path):
+    """
+    Rewrite a pending CSV archive as Parquet next to it, then delete the
+    CSV. Returns (archive_path, rows); (None, 0) if someone else already
+    compacted it.
+    """
+    pending = Path(pending)
+    path = pending.with_suffix(".parquet")
+    fd, tmp = tempfile.mkstemp(dir=pending.parent, prefix=path.name + ".",
+                               suffix=".tmp")
+    os.close(fd)
+
+    total = 0
+    writer = None
+    batch = []
+    try:
+        for _, _, row in history_store.scan(pending):
+            batch.append(row)
+            if len(batch) >= ROW_GROUP_ROWS:
+                writer = writer or pq.ParquetWriter(tmp, ARCHIVE_SCHEMA,
+                                                    compression="zstd")
+                writer.write_batch(rows_to_batch(batch))
+                total += len(batch)
+                batch = []
+        if batch:
+            writer = writer or pq.ParquetWriter(tmp, ARCHIVE_SCHEMA,
+                                                compression="zstd")
+            writer.write_batch(rows_to_batch(batch))
+            total += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if not total:
+        Path(tmp).unlink(missing_ok=True)
+        return None, 0
+    os.replace(tmp, path)
+    pending.unlink(missing_ok=True)
+
+    log.info("Compacted %d history rows into %s", total, path.name)
+    return path, total
+
+
+def compact_pending(archive_dir: Path) -> None:
+    """Compact every rotated CSV still waiting in archive_dir, oldest first."""
+    archive_dir = Path(archive_dir)
+    if not archive_dir.exists():
+        return
+    for pending in sorted(archive_dir.glob("history-*.csv")):
+        if pending.with_suffix(".parquet").exists():
+            pending.unlink(missing_ok=True)
+            continue
+        try:
+            compact(pending)
+        except Exception:
+            log.exception("Compacting %s failed", pending.name)
+
+
+# -------------------------------------------------
+# Reading
+# -------------------------------------------------
+def row_filter(since: datetime = None, until: datetime = None,
+               sentiment: str = "", authenticity: str = ""):
+    """
+    Parquet predicate on timestamp (since <= ts < until) and labels.
+    Returns None when there is nothing to filter on.
+    """
+    conds = []
+    if since is not None:
+        conds.append(ds.field("timestamp") >= pa.scalar(since, pa.timestamp("s")))
+    if until is not None:
+        conds.append(ds.field("timestamp") < pa.scalar(until, pa.timestamp("s")))
+    if sentiment:
+        conds.append(ds.field("sentiment") == sentiment)
+    if authenticity:
+        conds.append(ds.field("authenticity") == authenticity)
+    expr = None
+    for cond in conds:
+        expr = cond if expr is None else expr & cond
+    return expr
+
+
+def iter_batches(archive_dir: Path, columns=None, since=None, until=None,
+                 sentiment: str = "", authenticity: str = "",
+                 batch_size: int = ROW_GROUP_ROWS, files=None):
+    """Record batches from all archives, oldest first, projected/filtered."""
+    predicate = row_filter(since, until, sentiment, authenticity)
+    columns = list(columns or COLUMNS)
+    for path in archive_files(archive_dir) if files is None else files:
+        pending = _open_pending(path)
+        if pending is None:
+            dataset = ds.dataset(str(path.with_suffix(".parquet")),
+                                 format="parquet", schema=ARCHIVE_SCHEMA)
+            yield from dataset.to_batches(
+                columns=columns, filter=predicate, batch_size=batch_size,
+            )
+            continue
+        with pending:
+            rows = []
+            for _, _, row in history_store.scan_file(pending):
+                rows.append(row)
+                if len(rows) >= batch_size:
+                    yield from _select(rows_to_batch(rows), columns, predicate)
+                    rows = []
+            if rows:
+                yield from _select(rows_to_batch(rows), columns, predicate)
+
+
+def _open_pending(path: Path):
+    """
+    Open a pending CSV archive for reading. None for Parquet archives, and
+    for a CSV compacted since it was listed (read its Parquet twin instead).
+    """
+    if path.suffix != ".csv":
+        return None
+    try:
+        return path.open("rb")
+    except FileNotFoundError:
+        return None
+
+
+def _select(batch: pa.RecordBatch, columns, predicate):
+    table = pa.Table.from_batches([batch])
+    if predicate is not None:
+        table = table.filter(predicate)
+    yield from table.select(columns).to_batches()
+
+
+def _format(column: str, value):
+    """Render a value the way log_review writes it to the CSV."""
+    if value is None:
+        return ""
+    if column == "timestamp":
+        return value.strftime(TS_FORMAT)
+    if column.endswith("_prob"):
+        return f"{value:.1f}"
+    return value
+
+
+def batch_rows(batch: pa.RecordBatch):
+    """CSV-style row dicts from a record batch."""
+    cols = {name: batch.column(i).to_pylist()
+            for i, name in enumerate(batch.schema.names)}
+    for i in range(batch.num_rows):
+        yield {name: _format(name, values[i]) for name, values in cols.items()}
+
+
+def iter_rows(archive_dir: Path, columns=None, since=None, until=None):
+    """CSV-style row dicts from all archives, oldest first."""
+    for batch in iter_batches(archive_dir, columns, since, until):
+        yield from batch_rows(batch)
+
+
+def iter_file_rows(path: Path, columns=None):
+    """CSV-style row dicts from a single archive file."""
+    columns = list(columns or COLUMNS)
+    pending = _open_pending(path)
+    if pending is not None:
+        with pending:
+            for _, _, row in history_store.scan_file(pending):
+                yield {c: row.get(c, "") for c in columns}
+        return
+    pf = pq.ParquetFile(path.with_suffix(".parquet"))
+    for batch in pf.iter_batches(batch_size=ROW_GROUP_ROWS, columns=columns):
+        yield from batch_rows(batch)
+
+
+def count_rows(path: Path) -> int:
+    """Number of rows in one archive file."""
+    pending = _open_pending(path)
+    if pending is None:
+        return pq.ParquetFile(path.with_suffix(".parquet")).metadata.num_rows
+    with pending:
+        return sum(1 for _ in history_store.scan_file(pending))
+
+
+def read_rows_at(path: Path, positions):
+    """
+    Fetch rows by position within one Parquet archive, reading only their
+    row groups. (Rows of a pending CSV are read by byte offset instead.)
+    """
+    pf = pq.ParquetFile(path.with_suffix(".parquet"))
+    starts, start = [], 0
+    for i in range(pf.metadata.num_row_groups):
+        starts.append(start)
+        start += pf.metadata.row_group(i).num_rows
+
+    by_group = {}
+    for pos in positions:
+        group = bisect_right(starts, pos) - 1
+        by_group.setdefault(group, []).append(pos)
+
+    found = {}
+    for group, wanted in by_group.items():
+        table = pf.read_row_group(group)
+        taken = table.take([p - starts[group] for p in wanted])
+        for pos, row in zip(wanted, batch_rows(taken.combine_chunks().to_batches()[0])):
+            found[pos] = row
+    return [found[p] for p in positions]
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Compact the active history CSV into a Parquet archive."
+    )
+    ap.add_argument("--history", default="data/review_history.csv")
+    ap.add_argument("--archive-dir", default="data/history_archive")
+    args = ap.parse_args()
+
+    # same lock as the app's log_review, so no row is appended mid-rotation
+    with history_store.locked(Path(args.history)):
+        pending = rotate(Path(args.history), Path(args.archive_dir))
+    if pending is None:
+        print("Nothing to rotate, active history is empty.")
+    else:
+        path, n = compact(pending)
+        print(f"Archived {n} rows -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+Streaming export of the analysis history to CSV, Excel or Parquet.
+
+Rows are read in chunks (archives first, with filters pushed down, then the
+active CSV) and written straight out, so memory stays bounded no matter how
+many rows are exported. The Flask app runs every export as a background job
+(ExportJobs) so no request handler is tied up scanning the history; the same
+code is available from the command line (run from Flaskapp/):
+
+  python history_export.py --format xlsx --out exports/negative.xlsx \\
+      --since 2025-11-01 --sentiment Negative
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+try:
+    from . import history_archive, history_store
+except ImportError:
+    import history_archive
+    import history_store
+
+FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+             ".xlsx"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+COLUMNS = history_archive.COLUMNS
+CHUNK_ROWS = 10_000
+XLSX_SHEET_ROWS = 1_000_000   # Excel tops out at 1,048,576 rows per sheet
+JOB_TTL = 60 * 60             # seconds a finished export stays downloadable
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def parse_filters(since: str = "", until: str = "",
+                  sentiment: str = "", authenticity: str = "") -> dict:
+    """
+    Turn user-supplied YYYY-MM-DD dates and labels into export filters.
+    `until` is inclusive, so it becomes the start of the next day.
+    Raises ValueError on a malformed date.
+    """
+    since_dt = datetime.strptime(since, "%Y-%m-%d") if since else None
+    until_dt = (datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1)
+                if until else None)
+    return {
+        "since": since_dt,
+        "until": until_dt,
+        "sentiment": sentiment,
+        "authenticity": authenticity,
+    }
+
+
+def _keep(row: dict, since, until, sentiment, authenticity) -> bool:
+    if sentiment and row.get("sentiment") != sentiment:
+        return False
+    if authenticity and row.get("authenticity") != authenticity:
+        return False
+    if since is not None or until is not None:
+        ts = history_archive.parse_ts(row.get("timestamp"))
+        if ts is None:
+            return False
+        if since is not None and ts < since:
+            return False
+        if until is not None and ts >= until:
+            return False
+    return True
+
+
+def _inode(path: Path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def iter_chunks(history_file: Path, archive_dir: Path, since=None, until=None,
+                sentiment: str = "", authenticity: str = "", columns=None,
+                chunk_rows: int = CHUNK_ROWS):
+    """
+    Yield lists of CSV-style row dicts, oldest first: the archives, then the
+    active CSV. Rotations while we read neither drop nor repeat rows.
+    """
+    history_file = Path(history_file)
+    filters = dict(since=since, until=until, sentiment=sentiment,
+                   authenticity=authenticity)
+    columns = list(columns or COLUMNS)
+
+    def chunked(rows):
+        chunk = []
+        for row in rows:
+            if _keep(row, **filters):
+                chunk.append({c: row.get(c, "") for c in columns})
+                if len(chunk) >= chunk_rows:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    done = set()      # archives already read (by stem: CSV and Parquet twin)
+    skip = 0          # rows of the next new archive already read from the CSV
+    read = 0
+
+    def counted(f):
+        nonlocal read
+        for _, _, row in history_store.scan_file(f):
+            read += 1
+            yield row
+
+    while True:
+        # Open the CSV *before* listing the archives: if it is rotated after
+        # this point, its archive is in this listing or the next one.
+        try:
+            f = history_file.open("rb")
+        except FileNotFoundError:
+            f = None
+        try:
+            for path in history_archive.archive_files(archive_dir):
+                if path.stem in done:
+                    continue
+                if skip:
+                    # the CSV we read last round, rotated meanwhile
+                    rows = history_archive.iter_file_rows(path)
+                    yield from chunked(islice(rows, skip, None))
+                    skip = 0
+                else:
+                    for batch in history_archive.iter_batches(
+                        archive_dir, columns, files=[path],
+                        batch_size=chunk_rows, **filters
+                    ):
+                        if batch.num_rows:
+                            yield list(history_archive.batch_rows(batch))
+                done.add(path.stem)
+
+            if f is None:
+                if history_file.exists():
+                    continue   # created (or rotated in) meanwhile
+                return
+            inode = os.fstat(f.fileno()).st_ino
+            if _inode(history_file) != inode:
+                continue   # rotated before we read it: an archive by now
+            read = 0
+            yield from chunked(counted(f))
+        finally:
+            if f is not None:
+                f.close()
+
+        if _inode(history_file) == inode:
+            return
+        skip = read   # rotated while we read it
+
+
+# -------------------------------------------------
+# Writers
+# -------------------------------------------------
+def csv_stream(chunks, progress=None):
+    """Yield encoded CSV text one chunk at a time."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    done = 0
+    for chunk in chunks:
+        writer.writerows(chunk)
+        done += len(chunk)
+        if progress:
+            progress(done)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def write_csv(chunks, out: Path, progress=None) -> None:
+    with Path(out).open("wb") as f:
+        for data in csv_stream(chunks, progress):
+            f.write(data)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def write_xlsx(chunks, out: Path, progress=None) -> None:
+    """
+    Excel export using openpyxl's write-only (streaming) workbook. Review
+    text is user input, so text cells are written as plain strings (never
+    formulas) with the control characters Excel rejects stripped.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    def text(value):
+        cell = WriteOnlyCell(sheet, ILLEGAL_CHARACTERS_RE.sub("", str(value)))
+        cell.data_type = "s"
+        return cell
+
+    wb = Workbook(write_only=True)
+    sheet, sheet_rows, done = None, 0, 0
+    for chunk in chunks:
+        for row in chunk:
+            if sheet is None or sheet_rows >= XLSX_SHEET_ROWS:
+                sheet = wb.create_sheet(f"history_{len(wb.worksheets) + 1}")
+                sheet.append(COLUMNS)
+                sheet_rows = 0
+            sheet.append([
+                _to_float(row.get(c)) if c.endswith("_prob")
+                else text(row.get(c, ""))
+                for c in COLUMNS
+            ])
+            sheet_rows += 1
+        done += len(chunk)
+        if progress:
+            progress(done)
+    if sheet is None:
+        wb.create_sheet("history_1").append(COLUMNS)
+    wb.save(out)
+
+
+def write_parquet(chunks, out: Path, progress=None) -> None:
+    """Parquet export with the same schema as the history archives."""
+    done = 0
+    with pq.ParquetWriter(out, history_archive.ARCHIVE_SCHEMA,
+                          compression="zstd") as writer:
+        for chunk in chunks:
+            writer.write_batch(history_archive.rows_to_batch(chunk))
+            done += len(chunk)
+            if progress:
+                progress(done)
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "parquet": write_parquet}
+
+
+def export(fmt: str, out: Path, history_file: Path, archive_dir: Path,
+           progress=None, **filters) -> None:
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    WRITERS[fmt](iter_chunks(history_file, archive_dir, **filters),
+                 out, progress)
+
+
+# -------------------------------------------------
+# Background jobs (used by the Flask app)
+# -------------------------------------------------
+class ExportJobs:
+    """
+    Runs exports in daemon threads. Each job's progress lives in
+    out_dir/history-<id>.json next to its file, so any worker process can
+    report on and serve any job. Jobs and their files are deleted `ttl`
+    seconds after they were last touched.
+    """
+
+    def __init__(self, history_file: Path, archive_dir: Path, out_dir: Path,
+                 ttl: float = JOB_TTL):
+        self.history_file = Path(history_file)
+        self.archive_dir = Path(archive_dir)
+        self.out_dir = Path(out_dir)
+        self.ttl = ttl
+
+    def _status_file(self, job_id: str) -> Path:
+        return self.out_dir / f"history-{job_id}.json"
+
+    def start(self, fmt: str, filters: dict) -> str:
+        if fmt not in WRITERS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.prune()
+        job_id = uuid.uuid4().hex
+        path = self.out_dir / f"history-{job_id}{FORMATS[fmt][1]}"
+        job = {
+            "id": job_id,
+            "format": fmt,
+            "state": "running",
+            "rows": 0,
+            "error": "",
+        }
+        self._save(job)
+        threading.Thread(
+            target=self._run, args=(job, path, filters), daemon=True
+        ).start()
+        return job_id
+
+    def _save(self, job: dict) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.out_dir,
+                                   prefix=f"history-{job['id']}.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp, self._status_file(job["id"]))
+
+    def _update(self, job: dict, **fields) -> None:
+        job.update(fields)
+        self._save(job)
+
+    def _run(self, job, path, filters) -> None:
+        tmp = path.with_suffix(path.suffix + ".part")
+        try:
+            export(job["format"], tmp, self.history_file, self.archive_dir,
+                   progress=lambda n: self._update(job, rows=n), **filters)
+            tmp.replace(path)
+            self._update(job, state="done")
+        except Exception as e:
+            tmp.unlink(missing_ok=True)
+            self._update(job, state="failed", error=str(e))
+
+    def get(self, job_id: str):
+        """The job's status with the path of its file, or None if unknown."""
+        if not JOB_ID.fullmatch(job_id):
+            return None
+        self.prune()
+        try:
+            job = json.loads(self._status_file(job_id).read_text("utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        ext = FORMATS[job["format"]][1]
+        job["path"] = self.out_dir / f"history-{job_id}{ext}"
+        return job
+
+    def prune(self) -> None:
+        """Delete jobs (status, file, leftovers) untouched for `ttl` seconds."""
+        if not self.out_dir.exists():
+            return
+        cutoff = time.time() - self.ttl
+        for path in self.out_dir.glob("history-*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export the analysis history.")
+    ap.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--history", default="data/review_history.csv")
+    ap.add_argument("--archive-dir", default="data/history_archive")
+    ap.add_argument("--since", default="", help="YYYY-MM-DD (inclusive)")
+    ap.add_argument("--until", default="", help="YYYY-MM-DD (inclusive)")
+    ap.add_argument("--sentiment", default="", choices=["", "Positive", "Negative"])
+    ap.add_argument("--authenticity", default="", choices=["", "Genuine", "Fake"])
+    args = ap.parse_args()
+
+    filters = parse_filters(args.since, args.until,
+                            args.sentiment, args.authenticity)
+
+    def progress(n):
+        print(f"\r{n:,} rows exported", end="", file=sys.stderr, flush=True)
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    export(args.format, out, Path(args.history), Path(args.archive_dir),
+           progress=progress, **filters)
+    print(f"\nSaved {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Shared bookkeeping for the stores derived from review history (search index,
+rollups, near-duplicate clusters).
+
+A follower remembers which archives it has absorbed and how far into the
+active CSV it has read (bytes and rows), and saves that together with its own
+data. catch_up() brings it up to date with whatever is on disk, whichever
+process wrote it:
+
+- a new archive right after the known ones holds the CSV we were reading
+  when it was rotated, so its first `active_rows` rows are already absorbed
+  (while still a pending CSV it is simply read on from `offset`);
+- a known pending CSV replaced by its Parquet twin was compacted, rows and
+  order unchanged;
+- the oldest archives gone (retention) are handed to _dropped(), which
+  forgets them without re-reading anything;
+- anything else (archives replaced, the CSV truncated by hand) means a
+  rebuild. catch_up() runs under the history write lock, so it does not
+  rebuild itself: a background thread rebuilds a copy and swaps it in,
+  and the old state keeps serving (and absorbs nothing) until then.
+
+refresh() is the cheap version for request handlers: it only catches up when
+the history file or the archive directory changed since the last check.
+Stores with RELOAD_ON_CHANGE also reload their file when another process
+(e.g. `python rollups.py --backfill`) rewrote it.
+"""
+
+import copy
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from itertools import islice
+from pathlib import Path
+
+try:
+    from . import history_archive, history_store
+except ImportError:
+    import history_archive
+    import history_store
+
+log = logging.getLogger(__name__)
+
+
+def file_state(path: Path):
+    """(size, mtime_ns) of a file or directory, None if it does not exist."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class HistoryFollower:
+    """Base class for stores kept up to date from the history."""
+
+    VERSION = 1                 # bump in subclasses when the saved state changes
+    COLUMNS = None              # columns a subclass needs from archived rows
+    RELOAD_ON_CHANGE = False    # reload the file if someone else rewrote it
+    SEED_ROWS = None            # rebuild from only the newest N rows
+
+    def __init__(self, history_file: Path, state_file: Path,
+                 archive_dir: Path, save_every: int):
+        self.history_file = Path(history_file)
+        self.state_file = Path(state_file)
+        self.archive_dir = Path(archive_dir)
+        self.save_every = save_every
+        self._lock = threading.RLock()
+        self._seen = None
+        self._saved = None        # (size, mtime) of the file as we last wrote it
+        self._rebuilding = None   # background rebuild thread, while one runs
+        self._reset()
+
+    def _reset(self):
+        self.archives = []        # archive files already absorbed
+        self.offset = 0           # bytes of the active CSV already absorbed
+        self.active_rows = 0      # rows of the active CSV already absorbed
+        self._unsaved = 0
+        self._reset_data()
+
+    # -------------------------------------------------
+    # Subclass hooks (called with the lock held)
+    # -------------------------------------------------
+    def _reset_data(self) -> None:
+        raise NotImplementedError
+
+    def _add_row(self, row: dict, segment, position: int, offset) -> None:
+        """
+        Absorb one row. `segment` is the archive it lives in (None for the
+        active CSV), `position` its row number there and `offset` its byte
+        offset in that CSV (None for rows read from Parquet).
+        """
+        raise NotImplementedError
+
+    def _rotated(self, name: str) -> None:
+        """The active rows absorbed so far now live in archive `name`."""
+
+    def _compacted(self, old: str, new: str) -> None:
+        """Pending CSV archive `old` was rewritten as Parquet archive `new`."""
+
+    def _dropped(self, names: list) -> bool:
+        """
+        The oldest archives `names` were deleted. Return True if the store
+        has forgotten (or deliberately kept) their rows, False to rebuild.
+        """
+        return False
+
+    def _dump(self) -> dict:
+        raise NotImplementedError
+
+    def _restore(self, state: dict) -> None:
+        raise NotImplementedError
+
+    def _encode(self, state: dict) -> bytes:
+        return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _decode(self, data: bytes) -> dict:
+        return pickle.loads(data)
+
+    # -------------------------------------------------
+    # Persistence
+    # -------------------------------------------------
+    def load(self) -> int:
+        """Load the saved state (or rebuild) and absorb rows added since."""
+        with self._lock:
+            state = {}
+            if self.state_file.exists():
+                try:
+                    state = self._decode(self.state_file.read_bytes())
+                except Exception as e:
+                    log.warning("%s unreadable, rebuilding: %s",
+                                self.state_file.name, e)
+            self._reset()
+            if state.get("version") == self.VERSION:
+                self.archives = state["archives"]
+                self.offset = state["offset"]
+                self.active_rows = state["active_rows"]
+                self._restore(state)
+                added = 0
+            else:
+                added = self._rebuild()
+            added += self._sync(rebuild=True)
+            self.save()
+        return added
+
+    def save(self) -> None:
+        """Write the state through a temp file unique to this process."""
+        with self._lock:
+            state = {
+                "version": self.VERSION,
+                "archives": self.archives,
+                "offset": self.offset,
+                "active_rows": self.active_rows,
+            }
+            state.update(self._dump())
+            data = self._encode(state)
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.state_file.parent,
+                                       prefix=self.state_file.name + ".",
+                                       suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, self.state_file)
+            except OSError as e:
+                Path(tmp).unlink(missing_ok=True)
+                log.warning("Could not save %s: %s", self.state_file.name, e)
+                return
+            self._unsaved = 0
+            self._saved = file_state(self.state_file)
+
+    # -------------------------------------------------
+    # Following the history
+    # -------------------------------------------------
+    def catch_up(self) -> int:
+        """Absorb every row rotated or appended since last time."""
+        with self._lock:
+            added = self._sync()
+            self._unsaved += added
+            if self._unsaved >= self.save_every:
+                self.save()
+        return added
+
+    def refresh(self) -> int:
+        """catch_up(), but only if the history changed since the last check."""
+        state = file_state(self.state_file) if self.RELOAD_ON_CHANGE else None
+        seen = (file_state(self.history_file), file_state(self.archive_dir), state)
+        if seen == self._seen:
+            return 0
+        if state is not None and state != self._saved:
+            log.info("%s changed on disk, reloading", self.state_file.name)
+            added = self.load()
+            seen = seen[:2] + (self._saved,)
+        else:
+            added = self.catch_up()
+        self._seen = seen
+        return added
+
+    def _rebuild(self) -> int:
+        """Drop everything and absorb the whole history (or its newest rows)."""
+        self._reset()
+        if self.SEED_ROWS is None:
+            return self._sync(rebuild=True)
+
+        # Newest SEED_ROWS rows only: the tail of the active CSV first, then
+        # of the archives from newest to oldest. Older rows count as absorbed.
+        paths = history_archive.archive_files(self.archive_dir)
+        active = [(start, end) for start, end, _ in
+                  history_store.scan(self.history_file)]
+        budget = max(self.SEED_ROWS - len(active), 0)
+        skips = {}                # archive -> rows to skip (None: all)
+        for path in reversed(paths):
+            if not budget:
+                break
+            n = history_archive.count_rows(path)
+            take = min(n, budget)
+            skips[path.name] = n - take
+            budget -= take
+
+        added = 0
+        for path in paths:
+            self._rotated(path.name)
+            skip = skips.get(path.name)
+            if skip is not None:
+                rows = history_archive.iter_file_rows(path, self.COLUMNS)
+                for pos, row in enumerate(islice(rows, skip, None), skip):
+                    self._add_row(row, path.name, pos, None)
+                    added += 1
+            self.archives.append(path.name)
+
+        skip = max(len(active) - self.SEED_ROWS, 0)
+        if skip:
+            self.active_rows = skip
+            self.offset = active[skip - 1][1]
+        return added + self._sync(rebuild=True)
+
+    def _stale(self, reason: str, rebuild: bool) -> int:
+        if rebuild:
+            log.info("%s: %s, rebuilding", self.state_file.name, reason)
+            return self._rebuild()
+        log.info("%s: %s, rebuilding in the background",
+                 self.state_file.name, reason)
+        self._rebuilding = threading.Thread(target=self._rebuild_and_swap,
+                                            daemon=True)
+        self._rebuilding.start()
+        return 0
+
+    def _rebuild_and_swap(self) -> None:
+        """Rebuild into a copy without holding our lock, then adopt it."""
+        try:
+            fresh = copy.copy(self)
+            fresh._lock = threading.RLock()
+            fresh._rebuilding = None
+            with fresh._lock:
+                fresh._rebuild()
+            with self._lock:
+                for key, value in vars(fresh).items():
+                    if key not in ("_lock", "_rebuilding"):
+                        setattr(self, key, value)
+                self._rebuilding = None
+                self._seen = None
+                self._sync()
+                self.save()
+        except Exception:
+            log.exception("%s: background rebuild failed", self.state_file.name)
+        finally:
+            # unless _sync() above already started the next one
+            if self._rebuilding is threading.current_thread():
+                self._rebuilding = None
+
+    def _sync(self, rebuild: bool = False) -> int:
+        """
+        Absorb new archives and rows. A change we cannot follow rebuilds
+        inline with `rebuild`, otherwise on a background thread.
+        """
+        if self._rebuilding is not None:
+            return 0              # stale until the rebuild is swapped in
+        disk = [p.name for p in history_archive.archive_files(self.archive_dir)]
+        by_stem = {Path(name).stem: name for name in disk}
+        for i, name in enumerate(self.archives):
+            now = by_stem.get(Path(name).stem, name)
+            if now != name:
+                self._compacted(name, now)
+                self.archives[i] = now
+        if disk[:len(self.archives)] != self.archives:
+            gone = self._gone(disk)
+            if not gone or not self._dropped(gone):
+                return self._stale("archives changed", rebuild)
+            log.info("%s: dropped %d deleted archive(s)",
+                     self.state_file.name, len(gone))
+            del self.archives[:len(gone)]
+
+        added = 0
+        for name in disk[len(self.archives):]:
+            added += self._absorb_archive(name)
+
+        st = file_state(self.history_file)
+        if st is not None and st[0] < self.offset:
+            return self._stale("history file shrank", rebuild)
+        for start, end, row in history_store.scan(self.history_file,
+                                                  self.offset):
+            self._add_row(row, None, self.active_rows, start)
+            self.active_rows += 1
+            self.offset = end
+            added += 1
+        return added
+
+    def _gone(self, disk: list) -> list:
+        """The oldest known archives, if deleting them explains `disk`."""
+        cut = 0
+        while cut < len(self.archives) and self.archives[cut] not in disk:
+            cut += 1
+        rest = self.archives[cut:]
+        return self.archives[:cut] if disk[:len(rest)] == rest else []
+
+    def _absorb_archive(self, name: str) -> int:
+        """
+        Archive `name` holds the CSV we were reading when it was rotated:
+        skip the rows already absorbed from it and take the rest.
+        """
+        path = self.archive_dir / name
+        pending = None
+        if path.suffix == ".csv":
+            try:
+                pending = path.open("rb")
+            except FileNotFoundError:   # compacted since it was listed
+                name = path.with_suffix(".parquet").name
+        self._rotated(name)
+
+        added = 0
+        if pending is not None:
+            with pending:
+                for start, _, row in history_store.scan_file(pending,
+                                                             self.offset):
+                    self._add_row(row, name, self.active_rows + added, start)
+                    added += 1
+        else:
+            rows = history_archive.iter_file_rows(self.archive_dir / name,
+                                                  self.COLUMNS)
+            for row in islice(rows, self.active_rows, None):
+                self._add_row(row, name, self.active_rows + added, None)
+                added += 1
+        self.archives.append(name)
+        self.offset = 0
+        self.active_rows = 0
+        return added
@@ -0,0 +1,114 @@
+"""
+Low-level helpers for reading review_history.csv by byte offset.
+
+The derived indexes (search, rollups) remember how many bytes of the history
+file they have already consumed and use scan() to read only what was appended
+since. Reviews may contain newlines, so a CSV record can span several lines.
+
+Writers (the app's log_review and the rotation CLI) serialize on locked(),
+an OS-level lock on a file next to the history, so they also exclude each
+other across processes.
+"""
+
+import csv
+import io
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+
+def read_record(f):
+    """
+    Read one CSV record (which may span lines) from a binary file.
+    Returns (raw_bytes, offset); raw_bytes is b"" at EOF.
+    """
+    start = f.tell()
+    raw = f.readline()
+    # a quoted field with a newline inside leaves an odd number of quotes
+    while raw and raw.count(b'"') % 2 == 1:
+        more = f.readline()
+        if not more:
+            break
+        raw += more
+    return raw, start
+
+
+def parse_record(raw: bytes):
+    return next(csv.reader(io.StringIO(raw.decode("utf-8"))), [])
+
+
+def read_header(history_file: Path):
+    """Column names of the history file ([] if it does not exist yet)."""
+    history_file = Path(history_file)
+    if not history_file.exists():
+        return []
+    with history_file.open("rb") as f:
+        raw, _ = read_record(f)
+    return parse_record(raw) if raw else []
+
+
+def scan(history_file: Path, offset: int = 0):
+    """
+    Yield (start, end, row) for every complete row at or after `offset`.
+    `end` is the offset to resume from next time.
+    """
+    history_file = Path(history_file)
+    if not history_file.exists():
+        return
+    with history_file.open("rb") as f:
+        yield from scan_file(f, offset)
+
+
+def scan_file(f, offset: int = 0):
+    """scan() over a file already opened in binary mode."""
+    f.seek(0)
+    raw, _ = read_record(f)
+    if not raw:
+        return
+    header = parse_record(raw)
+    f.seek(max(offset, f.tell()))
+    while True:
+        raw, start = read_record(f)
+        if not raw or not raw.endswith(b"\n"):
+            break   # EOF or a row still being written
+        values = parse_record(raw)
+        if values:
+            yield start, f.tell(), dict(zip(header, values))
+
+
+def read_rows(history_file: Path, offsets, header=None):
+    """Fetch the rows starting at the given byte offsets."""
+    header = header or read_header(history_file)
+    rows = []
+    with Path(history_file).open("rb") as f:
+        for off in offsets:
+            f.seek(off)
+            raw, _ = read_record(f)
+            rows.append(dict(zip(header, parse_record(raw))))
+    return rows
+
+
+@contextmanager
+def locked(history_file: Path):
+    """Hold the exclusive writer lock of the history file (blocks)."""
+    lock_file = Path(history_file).with_suffix(".lock")
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    with lock_file.open("a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
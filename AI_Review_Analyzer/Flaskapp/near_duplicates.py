@@ -0,0 +1,207 @@
+"""
+Near-duplicate / template-spam index (MinHash + LSH)
+
+Most fake reviews we see are templated copies ("Very good product. Very good
+product."), so a review that lands in a big cluster of near-identical texts is
+suspicious on its own. This module keeps a MinHash signature per cluster and
+an LSH band table so a lookup only touches the few clusters sharing a band.
+
+Memory stays bounded: only one representative signature is kept per cluster
+(not one per review) and the least recently seen clusters are evicted once
+`max_clusters` is reached.
+
+The index follows the history like the search index (see history_follower):
+signatures, band table and LRU order are pickled next to the history file
+and caught up by byte offset, so startup only hashes the rows logged since
+the last save. Without a saved index it is seeded from the newest SEED_ROWS
+rows only; older clusters would mostly be evicted anyway.
+"""
+
+import heapq
+import re
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from .history_follower import HistoryFollower
+except ImportError:
+    from history_follower import HistoryFollower
+
+# 2**32 + 15 is prime and keeps (a * x + b) inside uint64 for 32-bit x
+_PRIME = np.uint64(4294967311)
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+SAMPLE_CHARS = 160   # text kept per cluster to show what it is about
+
+
+def shingles(text: str, k: int = 5):
+    """Character k-grams of the normalized text (lowercase, single spaces)."""
+    norm = _NON_WORD.sub(" ", (text or "").lower()).strip()
+    if not norm:
+        return set()
+    if len(norm) <= k:
+        return {norm}
+    return {norm[i:i + k] for i in range(len(norm) - k + 1)}
+
+
+class NearDuplicateIndex(HistoryFollower):
+    """Incremental MinHash/LSH index that groups near-identical reviews."""
+
+    VERSION = 2
+    COLUMNS = ["review"]
+    SEED_ROWS = 50_000
+
+    def __init__(self, history_file: Path, index_file: Path,
+                 archive_dir: Path, num_perm: int = 64, bands: int = 16,
+                 threshold: float = 0.7, max_clusters: int = 100_000,
+                 seed: int = 1, save_every: int = 500):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.max_clusters = max_clusters
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+        super().__init__(history_file, index_file, archive_dir, save_every)
+
+    def _reset_data(self):
+        # band key -> cluster id
+        self._buckets = {}
+        # cluster id -> [signature, band keys, size, sample]  (LRU order)
+        self._clusters = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._clusters)
+
+    def _dropped(self, names: list) -> bool:
+        # Clusters are approximate and evicted by age anyway; keep them.
+        return True
+
+    def _dump(self) -> dict:
+        entries = list(self._clusters.items())
+        return {
+            "next_id": self._next_id,
+            "cluster_ids": np.array([cid for cid, _ in entries], dtype=np.int64),
+            "signatures": np.array([e[0] for _, e in entries], dtype=np.uint32
+                                   ).reshape(-1, self.num_perm),
+            "sizes": np.array([e[2] for _, e in entries], dtype=np.int64),
+            "samples": [e[3] for _, e in entries],
+            "bucket_keys": np.fromiter(self._buckets.keys(), dtype=np.uint64,
+                                       count=len(self._buckets)),
+            "bucket_ids": np.fromiter(self._buckets.values(), dtype=np.int64,
+                                      count=len(self._buckets)),
+        }
+
+    def _restore(self, state: dict) -> None:
+        self._next_id = state["next_id"]
+        self._buckets = dict(zip(state["bucket_keys"].tolist(),
+                                 state["bucket_ids"].tolist()))
+        owned = {}
+        for key, cid in self._buckets.items():
+            owned.setdefault(cid, []).append(key)
+        self._clusters = OrderedDict(
+            (cid, [sig, tuple(owned.get(cid, ())), size, sample])
+            for cid, sig, size, sample in zip(state["cluster_ids"].tolist(),
+                                              state["signatures"],
+                                              state["sizes"].tolist(),
+                                              state["samples"])
+        )
+
+    def _add_row(self, row: dict, segment, position: int, offset) -> None:
+        self.add(row.get("review", ""))
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (num_perm uint32 values) of a review."""
+        grams = shingles(text)
+        if not grams:
+            return np.zeros(self.num_perm, dtype=np.uint32)
+        hashes = np.fromiter(
+            (zlib.crc32(g.encode("utf-8")) for g in grams),
+            dtype=np.uint64, count=len(grams),
+        )
+        perm = (hashes[:, None] * self._a + self._b) % _PRIME
+        return perm.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray):
+        # band number in the high bits, crc32 of the band below: one small
+        # int per band that is the same in every process (unlike hash())
+        r = self.rows
+        return [(i << 32) | zlib.crc32(sig[i * r:(i + 1) * r].tobytes())
+                for i in range(self.bands)]
+
+    def _match(self, sig: np.ndarray, keys):
+        """Best existing cluster for this signature, or None."""
+        best_id, best_sim = None, self.threshold
+        seen = set()
+        for key in keys:
+            cid = self._buckets.get(key)
+            if cid is None or cid in seen:
+                continue
+            seen.add(cid)
+            sim = float(np.mean(self._clusters[cid][0] == sig))
+            if sim >= best_sim:
+                best_id, best_sim = cid, sim
+        return best_id
+
+    def query(self, text: str) -> dict:
+        """Look up the cluster a review would join, without adding it."""
+        sig = self.signature(text)
+        with self._lock:
+            cid = self._match(sig, self._band_keys(sig))
+            size = self._clusters[cid][2] if cid is not None else 0
+        return {"cluster_id": cid, "cluster_size": size}
+
+    def add(self, text: str) -> dict:
+        """
+        Insert a review and return its cluster.
+        cluster_size counts this review too, so 1 means "first of its kind".
+        """
+        sig = self.signature(text)
+        keys = self._band_keys(sig)
+        with self._lock:
+            cid = self._match(sig, keys)
+            if cid is None:
+                cid = self._new_cluster(sig, keys, text)
+            entry = self._clusters[cid]
+            entry[2] += 1
+            self._clusters.move_to_end(cid)
+            return {"cluster_id": cid, "cluster_size": entry[2]}
+
+    def _new_cluster(self, sig, keys, text: str) -> int:
+        if len(self._clusters) >= self.max_clusters:
+            self._evict()
+        cid = self._next_id
+        self._next_id += 1
+        owned = []
+        for key in keys:
+            if key not in self._buckets:
+                self._buckets[key] = cid
+                owned.append(key)
+        self._clusters[cid] = [sig, tuple(owned), 0, text[:SAMPLE_CHARS]]
+        return cid
+
+    def _evict(self):
+        _, (_, owned, _, _) = self._clusters.popitem(last=False)
+        for key in owned:
+            self._buckets.pop(key, None)
+
+    def top_clusters(self, n: int = 10, min_size: int = 2):
+        """
+        Largest clusters, biggest first, as dicts with cluster_id, size and
+        sample (the start of the review that opened the cluster).
+        """
+        with self._lock:
+            top = heapq.nlargest(
+                n,
+                ((e[2], cid, e[3]) for cid, e in self._clusters.items()
+                 if e[2] >= min_size),
+            )
+        return [{"cluster_id": cid, "size": size, "sample": sample}
+                for size, cid, sample in top]
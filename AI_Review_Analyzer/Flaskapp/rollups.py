@@ -0,0 +1,185 @@
+"""
+Hourly and daily analytics rollups over review_history.csv.
+
+Every logged row is folded into one "hour" and one "day" bucket holding, per
+label, a count, the sum of confidences and a confidence histogram. The /stats
+dashboard reads only these buckets, never the history file itself.
+
+Rollups are saved as JSON next to the history file and caught up by byte
+offset, just like the search index (both are history_follower subclasses). To rebuild them from scratch in one
+streaming pass over the archives and the active history (run from Flaskapp/):
+
+  python rollups.py --backfill
+
+This is safe while the app is running: the app notices that rollups.json was
+rewritten and reloads it before serving /stats, instead of overwriting it
+with its in-memory copy.
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+try:
+    from .history_follower import HistoryFollower
+except ImportError:
+    from history_follower import HistoryFollower
+
+ROLLUP_VERSION = 3
+GRANULARITIES = {"hour": 13, "day": 10}   # prefix length of "YYYY-MM-DD HH:MM"
+ROLLUP_COLUMNS = ["timestamp", "sentiment", "sentiment_prob",
+                  "authenticity", "authenticity_prob"]
+
+# Confidence of the predicted class is always >= 50%, so the histogram covers
+# 50-100 in 5-point bins.
+HIST_LOW = 50.0
+HIST_STEP = 5.0
+HIST_BINS = 10
+
+
+def hist_bin(prob: float) -> int:
+    idx = int((prob - HIST_LOW) // HIST_STEP)
+    return min(max(idx, 0), HIST_BINS - 1)
+
+
+def _empty_label():
+    return {"count": 0, "prob_sum": 0.0, "hist": [0] * HIST_BINS}
+
+
+def _fold(bucket: dict, field: str, label: str, prob: float) -> None:
+    stats = bucket.setdefault(field, {}).setdefault(label, _empty_label())
+    stats["count"] += 1
+    stats["prob_sum"] += prob
+    stats["hist"][hist_bin(prob)] += 1
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Rollups(HistoryFollower):
+    """Time-bucketed counters kept up to date from the history file."""
+
+    VERSION = ROLLUP_VERSION
+    COLUMNS = ROLLUP_COLUMNS
+    RELOAD_ON_CHANGE = True
+
+    def __init__(self, history_file: Path, rollup_file: Path,
+                 archive_dir: Path, save_every: int = 50):
+        super().__init__(history_file, rollup_file, archive_dir, save_every)
+
+    def _reset_data(self):
+        self.buckets = {g: {} for g in GRANULARITIES}
+
+    def _dropped(self, names: list) -> bool:
+        # Retention deleted old archives: their buckets stay, so the
+        # dashboard still covers them (a backfill only recounts what is left).
+        return True
+
+    def _dump(self) -> dict:
+        return {"buckets": self.buckets}
+
+    def _restore(self, state: dict) -> None:
+        self.buckets = state["buckets"]
+
+    def _encode(self, state: dict) -> bytes:
+        return json.dumps(state).encode("utf-8")
+
+    def _decode(self, data: bytes) -> dict:
+        return json.loads(data.decode("utf-8"))
+
+    def _add_row(self, row: dict, segment, position: int, offset) -> None:
+        self.add_row(row)
+
+    def add_row(self, row: dict) -> None:
+        """Fold one history row into its hour and day buckets."""
+        ts = row.get("timestamp", "")
+        sentiment_prob = _to_float(row.get("sentiment_prob"))
+        authenticity_prob = _to_float(row.get("authenticity_prob"))
+        for gran, width in GRANULARITIES.items():
+            key = ts[:width]
+            if len(key) != width:
+                continue
+            bucket = self.buckets[gran].setdefault(key, {"total": 0})
+            bucket["total"] += 1
+            _fold(bucket, "sentiment", row.get("sentiment", ""), sentiment_prob)
+            _fold(bucket, "authenticity", row.get("authenticity", ""),
+                  authenticity_prob)
+
+    def backfill(self) -> int:
+        """Drop everything and rebuild from the full history in one pass."""
+        with self._lock:
+            added = self._rebuild()
+            self.save()
+        return added
+
+    def series(self, granularity: str = "day", limit: int = 30):
+        """
+        The latest `limit` buckets, oldest first, flattened for charts:
+        totals, positive/negative and genuine/fake counts, fake ratio and
+        average confidences.
+        """
+        with self._lock:
+            keys = sorted(self.buckets.get(granularity, {}))[-limit:]
+            raw = [(k, self.buckets[granularity][k]) for k in keys]
+
+        points = []
+        for key, b in raw:
+            sent = b.get("sentiment", {})
+            auth = b.get("authenticity", {})
+            s_count = sum(v["count"] for v in sent.values())
+            a_count = sum(v["count"] for v in auth.values())
+            fake = auth.get("Fake", {}).get("count", 0)
+            points.append({
+                "bucket": key,
+                "total": b["total"],
+                "positive": sent.get("Positive", {}).get("count", 0),
+                "negative": sent.get("Negative", {}).get("count", 0),
+                "genuine": auth.get("Genuine", {}).get("count", 0),
+                "fake": fake,
+                "fake_ratio": fake / a_count if a_count else 0.0,
+                "avg_sentiment_prob": (
+                    sum(v["prob_sum"] for v in sent.values()) / s_count
+                    if s_count else 0.0
+                ),
+                "avg_authenticity_prob": (
+                    sum(v["prob_sum"] for v in auth.values()) / a_count
+                    if a_count else 0.0
+                ),
+            })
+        return points
+
+    def histograms(self, granularity: str = "day", limit: int = 30):
+        """Confidence histograms per label, summed over the latest buckets."""
+        with self._lock:
+            keys = sorted(self.buckets.get(granularity, {}))[-limit:]
+            out = {"sentiment": {}, "authenticity": {}}
+            for key in keys:
+                bucket = self.buckets[granularity][key]
+                for field in out:
+                    for label, stats in bucket.get(field, {}).items():
+                        hist = out[field].setdefault(label, [0] * HIST_BINS)
+                        for i, n in enumerate(stats["hist"]):
+                            hist[i] += n
+        return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build analytics rollups.")
+    ap.add_argument("--history", default="data/review_history.csv")
+    ap.add_argument("--out", default="data/rollups.json")
+    ap.add_argument("--archive-dir", default="data/history_archive")
+    ap.add_argument("--backfill", action="store_true",
+                    help="rebuild from scratch instead of catching up")
+    args = ap.parse_args()
+
+    rollups = Rollups(Path(args.history), Path(args.out), Path(args.archive_dir))
+    n = rollups.backfill() if args.backfill else rollups.load()
+    print(f"Rollups up to date ({n} rows folded in) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
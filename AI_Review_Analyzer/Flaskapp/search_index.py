@@ -0,0 +1,235 @@
+"""
+Inverted index over review_history.csv for the /search page.
+
+Each logged row gets a doc id (its position in the whole history). For every
+token we keep a sorted posting list of doc ids, and the labels are indexed as
+pseudo-terms ("sentiment:Negative", "authenticity:Fake") so filtering is just
+another posting-list intersection. Rows are fetched back from the CSV by byte
+offset (from a rotated CSV awaiting compaction the same way, and from its
+Parquet archive by position after that), so only the rows on the requested
+page are ever parsed.
+
+The index is pickled next to the history file and caught up incrementally
+(see history_follower): on startup, after each logged review and before each
+query we only read what was appended or rotated since the last run.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from . import history_archive, history_store
+    from .history_follower import HistoryFollower, file_state
+except ImportError:
+    import history_archive
+    import history_store
+    from history_follower import HistoryFollower, file_state
+
+INDEX_VERSION = 6
+
+
+def _intersect(cand, other):
+    """Doc ids of sorted `cand` that are also in sorted `other`."""
+    lo = np.searchsorted(other, cand[0])
+    hi = np.searchsorted(other, cand[-1], "right")
+    window = other[lo:hi]
+    if not len(window):
+        return cand[:0]
+    if len(cand) * 16 < len(window):
+        # few candidates: binary-search each one
+        idx = np.searchsorted(window, cand)
+        np.minimum(idx, len(window) - 1, out=idx)
+        return cand[window[idx] == cand]
+    # similar sizes: merge (a stable sort of two sorted runs is one merge)
+    both = np.concatenate((cand, window))
+    both.sort(kind="stable")
+    return both[:-1][both[1:] == both[:-1]]
+
+
+def _newest_common(lists, limit: int) -> list:
+    """
+    The newest `limit` doc ids present in every posting list, newest first.
+    Works on zero-copy views of the arrays, taking blocks from the end of the
+    shortest list (doubling in size) until enough hits are found.
+    """
+    views = sorted((np.frombuffer(p, dtype=np.uintc) for p in lists), key=len)
+    shortest, others = views[0], views[1:]
+    found, n = [], 0
+    end, block = len(shortest), max(limit, 256)
+    while end > 0 and n < limit:
+        start = max(end - block, 0)
+        cand = shortest[start:end]
+        for other in others:
+            cand = _intersect(cand, other)
+            if not len(cand):
+                break
+        found.append(cand[::-1])
+        n += len(cand)
+        end, block = start, block * 2
+    # plain ints, so no view keeps the arrays from growing
+    return np.concatenate(found)[:limit].tolist() if found else []
+
+
+class SearchIndex(HistoryFollower):
+    """Incrementally maintained, persisted inverted index of the history."""
+
+    VERSION = INDEX_VERSION
+    COLUMNS = ["review", "sentiment", "authenticity"]
+
+    def __init__(self, history_file: Path, index_file: Path, archive_dir: Path,
+                 tokenize, save_every: int = 200):
+        self.tokenize = tokenize
+        super().__init__(history_file, index_file, archive_dir, save_every)
+
+    def _reset_data(self):
+        self.n_docs = 0
+        self.first_doc = 0        # doc ids below this were in deleted archives
+        self.segments = []        # (first doc id, archive file name)
+        self.segment_offsets = {} # pending CSV archive -> row byte offsets
+        self.active_base = 0      # doc id of the first row in the active CSV
+        self.row_offsets = array("Q")
+        self.postings = {}
+
+    def __len__(self):
+        return self.n_docs - self.first_doc
+
+    def _dump(self) -> dict:
+        return {
+            "n_docs": self.n_docs,
+            "first_doc": self.first_doc,
+            "segments": self.segments,
+            "segment_offsets": self.segment_offsets,
+            "active_base": self.active_base,
+            "row_offsets": self.row_offsets,
+            "postings": self.postings,
+        }
+
+    def _restore(self, state: dict) -> None:
+        for key in ("n_docs", "first_doc", "segments", "segment_offsets",
+                    "active_base", "row_offsets", "postings"):
+            setattr(self, key, state[key])
+
+    # -------------------------------------------------
+    # Indexing
+    # -------------------------------------------------
+    def _add_row(self, row: dict, segment, position: int, offset) -> None:
+        doc_id = self.n_docs
+        self.n_docs += 1
+        if segment is None:
+            self.row_offsets.append(offset)
+        else:
+            self.active_base = self.n_docs
+            if offset is not None:
+                self.segment_offsets[segment].append(offset)
+        terms = set(self.tokenize(row.get("review", "")))
+        terms.add(f"sentiment:{row.get('sentiment', '')}")
+        terms.add(f"authenticity:{row.get('authenticity', '')}")
+        for term in terms:
+            plist = self.postings.get(term)
+            if plist is None:
+                plist = self.postings[term] = array("I")
+            plist.append(doc_id)   # doc ids only grow, so lists stay sorted
+
+    def _rotated(self, name: str) -> None:
+        self.segments.append((self.active_base, name))
+        if name.endswith(".csv"):
+            # same file, just moved: the offsets stay valid
+            self.segment_offsets[name] = self.row_offsets
+        self.active_base = self.n_docs
+        self.row_offsets = array("Q")
+
+    def _compacted(self, old: str, new: str) -> None:
+        self.segments = [(first, new if name == old else name)
+                         for first, name in self.segments]
+        self.segment_offsets.pop(old, None)
+
+    def _dropped(self, names: list) -> bool:
+        # Oldest archives deleted: cut their doc ids off the front of every
+        # posting list. Doc ids of the remaining rows do not change.
+        self.segments = self.segments[len(names):]
+        for name in names:
+            self.segment_offsets.pop(name, None)
+        self.first_doc = (self.segments[0][0] if self.segments
+                          else self.active_base)
+        for term, plist in list(self.postings.items()):
+            cut = bisect_left(plist, self.first_doc)
+            if cut == len(plist):
+                del self.postings[term]
+            elif cut:
+                del plist[:cut]
+        return True
+
+    # -------------------------------------------------
+    # Querying
+    # -------------------------------------------------
+    def search(self, query: str = "", sentiment: str = "",
+               authenticity: str = "", page: int = 1, per_page: int = 20):
+        """
+        AND-search over review tokens plus optional label filters.
+        Returns (rows, has_next) with the newest matches first.
+        """
+        terms = set(self.tokenize(query or ""))
+        if sentiment:
+            terms.add(f"sentiment:{sentiment}")
+        if authenticity:
+            terms.add(f"authenticity:{authenticity}")
+        if not terms:
+            return [], False
+
+        page = max(page, 1)
+        skip = (page - 1) * per_page
+        # A rotation between planning and reading would leave the active
+        # offsets pointing into the fresh CSV; it always touches the archive
+        # directory, so re-plan if that changed underneath us.
+        for _ in range(3):
+            before = file_state(self.archive_dir)
+            # pick up rows logged (or rotated) by other worker processes
+            self.refresh()
+            result = self._page(terms, skip, per_page)
+            if result is None:
+                return [], False
+            if file_state(self.archive_dir) == before:
+                break
+        return result
+
+    def _page(self, terms, skip: int, per_page: int):
+        with self._lock:
+            lists = [self.postings.get(t) for t in terms]
+            if any(p is None for p in lists):
+                return None
+            hits = _newest_common(lists, skip + per_page + 1)
+            page_docs = hits[skip:skip + per_page]
+            active = [self.row_offsets[d - self.active_base]
+                      for d in page_docs if d >= self.active_base]
+            archived = {}
+            starts = [first for first, _ in self.segments]
+            for d in page_docs:
+                if d < self.active_base:
+                    seg = bisect_right(starts, d) - 1
+                    first, name = self.segments[seg]
+                    archived.setdefault(name, []).append(d - first)
+            pending = {
+                name: [self.segment_offsets[name][p] for p in positions]
+                for name, positions in archived.items()
+                if name in self.segment_offsets
+            }
+
+        has_next = len(hits) > skip + per_page
+        # newest first: active rows, then archives from newest to oldest
+        rows = history_store.read_rows(self.history_file, active)
+        for name in sorted(archived, reverse=True):
+            path = self.archive_dir / name
+            if name in pending:
+                try:
+                    rows.extend(history_store.read_rows(path, pending[name]))
+                    continue
+                except FileNotFoundError:
+                    pass   # compacted meanwhile, same positions in Parquet
+            try:
+                rows.extend(history_archive.read_rows_at(path, archived[name]))
+            except FileNotFoundError:
+                pass       # deleted; dropped (or rebuilt) on the next catch-up
+        return rows, has_next
@@ -0,0 +1,88 @@
+import csv
+import sys
+from pathlib import Path
+
+import pytest
+
+# the modules import each other as top-level modules when run from Flaskapp/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import history_archive  # noqa: E402
+
+REVIEWS = [
+    "Great battery life, love it",
+    "Battery died after a week",
+    "Screen cracked\non day one",
+    'Says "great" but feels cheap',
+    "Very good product. Very good product.",
+]
+
+
+def make_rows(n: int, start: int = 0):
+    """History rows with multi-line and quoted reviews, unique per index."""
+    rows = []
+    for i in range(start, start + n):
+        rows.append({
+            "timestamp": f"2025-11-{1 + i % 28:02d} {i % 24:02d}:00",
+            "review": f"{REVIEWS[i % len(REVIEWS)]} #{i}",
+            "sentiment": "Positive" if i % 3 else "Negative",
+            "sentiment_prob": f"{50 + i % 50:.1f}",
+            "authenticity": "Fake" if i % 4 == 0 else "Genuine",
+            "authenticity_prob": f"{60 + i % 40:.1f}",
+        })
+    return rows
+
+
+def append(history_file: Path, rows) -> None:
+    """Append rows the way app.log_review does."""
+    first_time = not history_file.exists()
+    with history_file.open("a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if first_time:
+            writer.writerow(history_archive.COLUMNS)
+        for row in rows:
+            writer.writerow([row[c] for c in history_archive.COLUMNS])
+
+
+def wait_for_rebuild(store) -> None:
+    """Let a background rebuild started by catch_up() finish."""
+    thread = store._rebuilding
+    if thread is not None:
+        thread.join()
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / "review_history.csv", tmp_path / "history_archive"
+
+
+@pytest.fixture
+def web(tmp_path, monkeypatch):
+    """
+    The Flask app module with its history and derived stores moved to
+    tmp_path, so requests never touch Flaskapp/data. Needs the models.
+    """
+    app = pytest.importorskip("app")
+    from near_duplicates import NearDuplicateIndex
+    from rollups import Rollups
+    from search_index import SearchIndex
+
+    history_file, archive_dir = tmp_path / "review_history.csv", tmp_path / "a"
+    monkeypatch.setattr(app, "HISTORY_FILE", history_file)
+    monkeypatch.setattr(app, "ARCHIVE_DIR", archive_dir)
+    monkeypatch.setattr(app, "SEARCH_INDEX", SearchIndex(
+        history_file, tmp_path / "search_index.pkl", archive_dir, app.tokenize
+    ))
+    monkeypatch.setattr(app, "ROLLUPS", Rollups(
+        history_file, tmp_path / "rollups.json", archive_dir
+    ))
+    monkeypatch.setattr(app, "DUP_INDEX", NearDuplicateIndex(
+        history_file, tmp_path / "near_duplicates.pkl", archive_dir
+    ))
+    monkeypatch.setattr(app, "EXPORT_JOBS", app.history_export.ExportJobs(
+        history_file, archive_dir, tmp_path / "exports"
+    ))
+    monkeypatch.setattr(app, "RENDER_CACHE", type(app.RENDER_CACHE)())
+    for store in (app.SEARCH_INDEX, app.ROLLUPS, app.DUP_INDEX):
+        store.load()
+    return app
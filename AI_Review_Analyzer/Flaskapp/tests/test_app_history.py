@@ -0,0 +1,21 @@
+import history_archive
+
+
+def test_failed_rotation_keeps_the_row_and_retries(web, monkeypatch):
+    client = web.app.test_client()
+    monkeypatch.setattr(history_archive, "should_rotate", lambda *a: True)
+    real_rotate = history_archive.rotate
+
+    def locked_rotate(*args):
+        raise PermissionError("review_history.csv is open elsewhere")
+
+    monkeypatch.setattr(history_archive, "rotate", locked_rotate)
+    for text in ("great battery", "battery died"):
+        assert client.post("/analyze", data={"review": text}).status_code == 200
+    assert len(list(web.history_store.scan(web.HISTORY_FILE))) == 2
+    assert not web.ARCHIVE_DIR.exists()
+
+    monkeypatch.setattr(history_archive, "rotate", real_rotate)
+    assert client.post("/analyze", data={"review": "ok"}).status_code == 200
+    assert len(history_archive.archive_files(web.ARCHIVE_DIR)) == 1
+    assert len(web.SEARCH_INDEX) == 3
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from explain import ForestExplainer, LinearExplainer
+
+TEXTS = [
+    "great battery love it", "battery died after a week", "very good product",
+    "screen cracked on day one", "love the screen", "cheap and bad",
+    "good value great phone", "worst phone ever bad battery",
+    "very good product very good product", "fast delivery good",
+]
+LABELS = ["pos", "neg", "pos", "neg", "pos", "neg", "pos", "neg", "pos", "pos"]
+
+
+@pytest.fixture
+def X():
+    vect = TfidfVectorizer(ngram_range=(1, 2)).fit(TEXTS)
+    return vect, vect.transform(TEXTS + ["bad screen", "unseen words only"])
+
+
+def test_forest_leaves_and_contributions_reproduce_the_model(X):
+    vect, X = X
+    forest = RandomForestClassifier(n_estimators=15, random_state=0)
+    forest.fit(vect.transform(TEXTS), LABELS)
+    exp = ForestExplainer(forest, vect)
+
+    dense = X.toarray().astype(np.float32)
+    leaves = exp.leaves(dense)
+    assert (leaves - exp._roots == forest.apply(X)).all()
+
+    # mean root probability + summed path contributions == predict_proba
+    roots = np.mean([
+        est.tree_.value[0, 0] / est.tree_.value[0, 0].sum()
+        for est in forest.estimators_
+    ], axis=0)
+    proba = forest.predict_proba(X)
+    for c in range(len(forest.classes_)):
+        contrib = np.asarray(
+            exp._leaf_contrib[c][leaves.ravel()].sum(axis=1)
+        ).reshape(leaves.shape).sum(axis=1) / exp.n_trees
+        assert np.allclose(roots[c] + contrib, proba[:, c])
+
+    pred = proba.argmax(axis=1)
+    for terms in exp.explain(X, pred, top_k=3):
+        assert len(terms) <= 3
+        weights = [abs(t["weight"]) for t in terms]
+        assert weights == sorted(weights, reverse=True)
+
+
+@pytest.mark.parametrize("labels", [LABELS, [
+    "pos", "neg", "pos", "neg", "mid", "neg", "pos", "mid", "pos", "mid",
+]])
+def test_linear_weights_are_tfidf_times_coefficient(X, labels):
+    vect, X = X
+    model = LogisticRegression().fit(vect.transform(TEXTS), labels)
+    exp = LinearExplainer(model, vect)
+    names = list(vect.get_feature_names_out())
+    pred = model.predict_proba(X).argmax(axis=1)
+
+    for i, terms in enumerate(exp.explain(X, pred, top_k=100)):
+        row = X.getrow(i)
+        assert len(terms) == row.nnz
+        for t in terms:
+            j = names.index(t["term"])
+            if len(model.classes_) == 2:
+                # binary coef_ points towards classes_[1]
+                expected = row[0, j] * model.coef_[0, j]
+                expected = expected if pred[i] == 1 else -expected
+            else:
+                expected = row[0, j] * model.coef_[pred[i], j]
+            assert t["weight"] == pytest.approx(expected)
+            assert t["present"]
+
+
+def test_score_reviews_explains_a_batch(web):
+    texts = ["Very good product. Very good product.", "battery died",
+             "screen cracked on day one, awful"]
+    plain = web.score_reviews(texts)
+    explained = web.score_reviews(texts, explain=True, top_k=3)
+    for p, e in zip(plain, explained):
+        assert {k: e[k] for k in p} == p
+        for key in ("sentiment_terms", "authenticity_terms"):
+            assert len(e[key]) <= 3
+            assert all({"term", "weight", "present"} <= set(t) for t in e[key])
+    # one batch gives the same answers as one review at a time
+    assert explained == [web.score_reviews([t], explain=True, top_k=3)[0]
+                         for t in texts]
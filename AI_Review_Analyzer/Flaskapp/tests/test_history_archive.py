@@ -0,0 +1,39 @@
+import history_archive
+import history_store
+from conftest import append, make_rows
+
+
+def test_read_rows_at_across_row_groups(paths, monkeypatch):
+    history_file, archive_dir = paths
+    monkeypatch.setattr(history_archive, "ROW_GROUP_ROWS", 4)
+    rows = make_rows(11)
+    append(history_file, rows)
+    path, n = history_archive.compact(
+        history_archive.rotate(history_file, archive_dir)
+    )
+    assert n == 11
+    assert history_archive.count_rows(path) == 11
+
+    positions = [10, 0, 5, 4, 3]
+    got = history_archive.read_rows_at(path, positions)
+    assert [r["review"] for r in got] == [rows[p]["review"] for p in positions]
+    assert got[1] == rows[0]
+
+
+def test_pending_archive_reads_like_parquet(paths):
+    history_file, archive_dir = paths
+    rows = make_rows(9)
+    append(history_file, rows)
+    pending = history_archive.rotate(history_file, archive_dir)
+    assert pending.suffix == ".csv"
+    assert list(history_store.scan(history_file)) == []
+
+    def read():
+        return list(history_archive.iter_rows(archive_dir, ["review"]))
+
+    before = read()
+    history_archive.compact_pending(archive_dir)
+    assert [p.suffix for p in history_archive.archive_files(archive_dir)] == [
+        ".parquet"
+    ]
+    assert read() == before == [{"review": r["review"]} for r in rows]
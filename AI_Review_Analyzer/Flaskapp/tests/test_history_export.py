@@ -0,0 +1,49 @@
+import history_archive
+import history_export
+from conftest import append, make_rows
+
+
+def test_iter_chunks_rotation_mid_read(paths):
+    history_file, archive_dir = paths
+    for at in range(8):
+        if history_file.exists():
+            history_file.unlink()
+        for p in history_archive.archive_files(archive_dir):
+            p.unlink()
+        append(history_file, make_rows(6))
+        history_archive.compact(
+            history_archive.rotate(history_file, archive_dir)
+        )
+        append(history_file, make_rows(6, 6))
+        expected = [r["review"] for r in make_rows(12)]
+
+        got = []
+        chunks = history_export.iter_chunks(history_file, archive_dir,
+                                            chunk_rows=2)
+        for i, chunk in enumerate(chunks):
+            got += [r["review"] for r in chunk]
+            if i == at:
+                append(history_file, make_rows(1, 12))
+                history_archive.rotate(history_file, archive_dir)
+                append(history_file, make_rows(1, 13))
+        assert len(got) == len(set(got)), at
+        assert set(expected) <= set(got), at
+
+
+def test_xlsx_writes_review_text_as_plain_strings(tmp_path):
+    from openpyxl import load_workbook
+
+    rows = make_rows(3)
+    rows[0]["review"] = '=HYPERLINK("http://evil","click")'
+    rows[1]["review"] = "bad\x08char"
+    rows[2]["review"] = "+1 @everyone -great"
+    out = tmp_path / "history.xlsx"
+    history_export.write_xlsx([rows], out)
+
+    sheet = load_workbook(out)["history_1"]
+    reviews = [c for (c,) in sheet.iter_rows(min_row=2, min_col=2, max_col=2)]
+    assert [c.data_type for c in reviews] == ["s", "s", "s"]
+    assert [c.value for c in reviews] == [
+        '=HYPERLINK("http://evil","click")', "badchar", "+1 @everyone -great"
+    ]
+    assert sheet["D2"].value == float(rows[0]["sentiment_prob"])
@@ -0,0 +1,25 @@
+import history_store
+from conftest import append, make_rows
+
+
+def test_scan_resumes_by_offset_and_skips_partial_rows(paths):
+    history_file, _ = paths
+    rows = make_rows(7)
+    append(history_file, rows)
+
+    scanned = list(history_store.scan(history_file))
+    assert [r for _, _, r in scanned] == rows
+    assert scanned[0][0] > 0   # header is skipped
+
+    # resuming from a row's end offset yields only the rows after it
+    resumed = list(history_store.scan(history_file, scanned[3][1]))
+    assert [r for _, _, r in resumed] == rows[4:]
+    assert [s for s, _, _ in resumed] == [s for s, _, _ in scanned[4:]]
+
+    # a row still being written (no newline yet) is not returned
+    with history_file.open("ab") as f:
+        f.write(b'2025-11-01 10:00,"half a\nrow')
+    assert len(list(history_store.scan(history_file))) == 7
+
+    offsets = [scanned[5][0], scanned[2][0]]
+    assert history_store.read_rows(history_file, offsets) == [rows[5], rows[2]]
@@ -0,0 +1,38 @@
+import history_archive
+from conftest import append, make_rows
+from near_duplicates import NearDuplicateIndex
+
+
+def test_near_duplicates_persist_and_catch_up(paths, tmp_path):
+    history_file, archive_dir = paths
+    index_file = tmp_path / "near_duplicates.pkl"
+    append(history_file, make_rows(20))
+    dups = NearDuplicateIndex(history_file, index_file, archive_dir)
+    dups.load()
+    spam = "Very good product. Very good product."
+    assert dups.query(spam)["cluster_size"] == 4
+
+    history_archive.rotate(history_file, archive_dir)
+    append(history_file, make_rows(5, 20))
+    dups.catch_up()
+    dups.save()
+
+    reloaded = NearDuplicateIndex(history_file, index_file, archive_dir)
+    reloaded.load()
+    assert reloaded.query(spam) == dups.query(spam)
+    assert list(reloaded._clusters) == list(dups._clusters)
+    assert reloaded.top_clusters(1)[0]["size"] == 5
+
+
+def test_near_duplicates_seed_from_newest_rows(paths, tmp_path, monkeypatch):
+    history_file, archive_dir = paths
+    monkeypatch.setattr(NearDuplicateIndex, "SEED_ROWS", 7)
+    append(history_file, make_rows(10))
+    history_archive.compact(history_archive.rotate(history_file, archive_dir))
+    append(history_file, make_rows(5, 10))
+
+    dups = NearDuplicateIndex(history_file, tmp_path / "d.pkl", archive_dir)
+    dups.load()
+    # 5 active rows + the last 2 archived ones (#8 and #9)
+    assert sum(e[2] for e in dups._clusters.values()) == 7
+    assert dups.offset == history_file.stat().st_size
@@ -0,0 +1,73 @@
+import sys
+
+
+def test_etag_gives_304_until_the_history_changes(web):
+    client = web.app.test_client()
+    client.post("/analyze", data={"review": "great battery"})
+    first = client.get("/history")
+    assert first.status_code == 200 and first.headers["ETag"]
+
+    etag = {"If-None-Match": first.headers["ETag"]}
+    again = client.get("/history", headers=etag)
+    assert again.status_code == 304
+    assert again.data == b""
+
+    client.post("/analyze", data={"review": "battery died"})
+    after = client.get("/history", headers=etag)
+    assert after.status_code == 200
+    assert after.headers["ETag"] != first.headers["ETag"]
+    assert b"battery died" in after.data
+
+
+def test_if_modified_since_only_counts_for_static_pages(web):
+    client = web.app.test_client()
+    client.post("/analyze", data={"review": "great battery"})
+    future = "Fri, 01 Jan 2100 00:00:00 GMT"
+
+    for url in ("/history", "/word_cloud", "/stats"):
+        resp = client.get(url, headers={"If-Modified-Since": future})
+        assert resp.status_code == 200, url
+        assert "Last-Modified" not in resp.headers, url
+
+    about = client.get("/about")
+    assert about.headers["Last-Modified"]
+    since = {"If-Modified-Since": about.headers["Last-Modified"]}
+    assert client.get("/about", headers=since).status_code == 304
+
+
+def test_junk_query_strings_share_one_cache_entry(web):
+    client = web.app.test_client()
+    for i in range(20):
+        assert client.get(f"/history?junk={i}").status_code == 200
+        assert client.get(f"/history?since=not-a-date-{i}").status_code == 200
+        assert client.get(f"/stats?granularity=x{i}&limit=abc&junk={i}"
+                          ).status_code == 200
+    client.get("/history?since=2025-11-01")
+    assert set(web.RENDER_CACHE) == {
+        "history", "history|2025-11-01", "stats|day|30",
+    }
+
+
+def test_cache_stays_under_its_byte_budget(web, monkeypatch):
+    page = "x" * 1000
+    size = sys.getsizeof(page)
+    monkeypatch.setattr(web, "RENDER_CACHE_MAX_BYTES", 3 * size)
+    monkeypatch.setattr(web, "RENDER_CACHE_MAX_PAGE", 2 * size)
+
+    for i in range(10):
+        web.cache_html(f"page{i}", "v", page)
+        cached = sum(sys.getsizeof(h) for _, h in web.RENDER_CACHE.values())
+        assert cached <= web.RENDER_CACHE_MAX_BYTES
+    assert list(web.RENDER_CACHE) == ["page7", "page8", "page9"]
+
+    # a page over the per-page cap is never kept, and replaces nothing
+    web.cache_html("huge", "v", page * 3)
+    assert "huge" not in web.RENDER_CACHE
+    assert len(web.RENDER_CACHE) == 3
+
+    # rendered pages go through the same budget
+    client = web.app.test_client()
+    client.get("/about")
+    client.get("/how_it_works")
+    cached = sum(sys.getsizeof(h) for _, h in web.RENDER_CACHE.values())
+    assert cached <= web.RENDER_CACHE_MAX_BYTES
@@ -0,0 +1,49 @@
+import history_archive
+from conftest import append, make_rows, wait_for_rebuild
+from rollups import Rollups
+
+
+def total(rollups):
+    return sum(p["total"] for p in rollups.series("day", 1000))
+
+
+def test_rollups_rebuild_after_history_shrinks(paths, tmp_path):
+    history_file, archive_dir = paths
+    append(history_file, make_rows(12))
+    rollups = Rollups(history_file, tmp_path / "rollups.json", archive_dir)
+    rollups.load()
+    assert total(rollups) == 12
+
+    # truncated by hand: fewer bytes than already folded in. catch_up()
+    # leaves the rebuild to a background thread and keeps the old counts.
+    history_file.unlink()
+    append(history_file, make_rows(3, 100))
+    with rollups._lock:   # hold off the swap
+        assert rollups.catch_up() == 0
+        assert total(rollups) == 12
+    wait_for_rebuild(rollups)
+    assert total(rollups) == 3
+    append(history_file, make_rows(2, 103))
+    rollups.catch_up()
+    assert total(rollups) == 5
+
+
+def test_rollups_follow_rotation_and_reload_backfill(paths, tmp_path):
+    history_file, archive_dir = paths
+    rollup_file = tmp_path / "rollups.json"
+    append(history_file, make_rows(8))
+    app_rollups = Rollups(history_file, rollup_file, archive_dir)
+    app_rollups.load()
+
+    append(history_file, make_rows(2, 8))
+    history_archive.rotate(history_file, archive_dir)
+    append(history_file, make_rows(5, 10))
+    app_rollups.refresh()
+    assert total(app_rollups) == 15
+
+    # a backfill from the CLI replaces the file; the app reloads it
+    app_rollups.buckets["day"]["1999-01-01"] = {"total": 99}
+    Rollups(history_file, rollup_file, archive_dir).backfill()
+    app_rollups.refresh()
+    assert "1999-01-01" not in app_rollups.buckets["day"]
+    assert total(app_rollups) == 15
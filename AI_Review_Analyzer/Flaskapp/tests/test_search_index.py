@@ -0,0 +1,148 @@
+import re
+
+import history_archive
+import history_store
+from conftest import append, make_rows, wait_for_rebuild
+from search_index import SearchIndex
+
+
+def tokenize(text):
+    return [t for t in re.findall(r"[a-z']+", text.lower()) if len(t) > 2]
+
+
+def all_rows(history_file, archive_dir):
+    rows = list(history_archive.iter_rows(archive_dir))
+    return rows + [row for _, _, row in history_store.scan(history_file)]
+
+
+def brute_force(history_file, archive_dir, query, sentiment=""):
+    terms = set(tokenize(query))
+    return [
+        row["review"]
+        for row in reversed(all_rows(history_file, archive_dir))
+        if terms <= set(tokenize(row["review"]))
+        and (not sentiment or row["sentiment"] == sentiment)
+    ]
+
+
+def assert_search_matches(index, history_file, archive_dir):
+    for query, sentiment in [("battery", ""), ("great", ""), ("day", ""),
+                             ("product", "Negative"), ("", "Positive")]:
+        rows, _ = index.search(query, sentiment=sentiment, per_page=1000)
+        assert [r["review"] for r in rows] == brute_force(
+            history_file, archive_dir, query, sentiment
+        ), (query, sentiment)
+
+
+def test_search_matches_brute_force_across_rotation(paths, tmp_path):
+    history_file, archive_dir = paths
+    index_file = tmp_path / "search_index.pkl"
+    append(history_file, make_rows(20))
+    index = SearchIndex(history_file, index_file, archive_dir, tokenize)
+    index.load()
+    assert_search_matches(index, history_file, archive_dir)
+
+    # rotated but not compacted yet, with rows appended before the move
+    append(history_file, make_rows(5, 20))
+    history_archive.rotate(history_file, archive_dir)
+    append(history_file, make_rows(6, 25))
+    assert_search_matches(index, history_file, archive_dir)
+
+    history_archive.compact_pending(archive_dir)
+    assert_search_matches(index, history_file, archive_dir)
+    assert len(index) == 31
+
+    # saved state and a from-scratch build agree
+    index.save()
+    reloaded = SearchIndex(history_file, index_file, archive_dir, tokenize)
+    reloaded.load()
+    assert reloaded.archives == index.archives
+    assert_search_matches(reloaded, history_file, archive_dir)
+    fresh = SearchIndex(history_file, tmp_path / "other.pkl", archive_dir,
+                        tokenize)
+    fresh.load()
+    assert fresh.postings == reloaded.postings
+
+
+def test_search_picks_up_rotation_by_another_process(paths, tmp_path):
+    history_file, archive_dir = paths
+    append(history_file, make_rows(10))
+    index = SearchIndex(history_file, tmp_path / "i.pkl", archive_dir, tokenize)
+    index.load()
+
+    # another worker logs rows and rotates; this index is never told
+    append(history_file, make_rows(4, 10))
+    history_archive.compact(history_archive.rotate(history_file, archive_dir))
+    append(history_file, make_rows(3, 14))
+    assert_search_matches(index, history_file, archive_dir)
+    assert len(index) == 17
+
+
+def test_search_drops_deleted_archives_without_rebuilding(
+        paths, tmp_path, monkeypatch):
+    history_file, archive_dir = paths
+    index = SearchIndex(history_file, tmp_path / "i.pkl", archive_dir, tokenize)
+    for start in (0, 10, 20):
+        append(history_file, make_rows(10, start))
+        index.catch_up()
+        history_archive.rotate(history_file, archive_dir)
+    history_archive.compact_pending(archive_dir)
+    append(history_file, make_rows(4, 30))
+    index.catch_up()
+    assert len(index) == 34
+
+    def no_rebuild():
+        raise AssertionError("rebuilt")
+
+    monkeypatch.setattr(index, "_rebuild", no_rebuild)
+    # retention deletes the two oldest archives
+    for path in history_archive.archive_files(archive_dir)[:2]:
+        path.unlink()
+    assert_search_matches(index, history_file, archive_dir)
+    assert len(index) == 14
+    assert min(p[0] for p in index.postings.values()) == 20
+
+    index.save()
+    reloaded = SearchIndex(history_file, tmp_path / "i.pkl", archive_dir,
+                           tokenize)
+    reloaded.load()
+    assert_search_matches(reloaded, history_file, archive_dir)
+
+
+def test_search_rebuilds_in_background_when_archives_change(paths, tmp_path):
+    history_file, archive_dir = paths
+    append(history_file, make_rows(10))
+    index = SearchIndex(history_file, tmp_path / "i.pkl", archive_dir, tokenize)
+    index.load()
+    history_archive.rotate(history_file, archive_dir)
+    append(history_file, make_rows(5, 10))
+    index.catch_up()
+
+    # an older archive restored by hand: old rows stay searchable meanwhile
+    restored = archive_dir / "history-20000101000000000000.csv"
+    append(restored, make_rows(3, 50))
+    with index._lock:     # hold off the swap
+        assert index.catch_up() == 0
+        assert len(index) == 15
+    wait_for_rebuild(index)
+    assert_search_matches(index, history_file, archive_dir)
+    assert len(index) == 18
+
+
+def test_newest_common_matches_set_intersection():
+    import random
+    from array import array
+
+    from search_index import _newest_common
+
+    rng = random.Random(0)
+    for _ in range(200):
+        n = rng.choice([10, 1000, 5000])
+        lists = [
+            array("I", sorted(rng.sample(range(n), rng.randint(1, n // 2))))
+            for _ in range(rng.randint(1, 3))
+        ]
+        limit = rng.choice([1, 21, 300, n])
+        common = sorted(set.intersection(*map(set, lists)), reverse=True)
+        assert _newest_common(lists, limit) == common[:limit]
+        lists[0].append(n)   # the arrays can still grow afterwards